@@ -1,17 +1,23 @@
 import heapq
 import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
 import numpy as np
 
-from python_tsp.exact import solve_tsp_dynamic_programming
-
 from entities.entity import CellState, Obstacle, Grid
 from entities.robot import Robot
+from tools.collision_numba import (
+    reachable_kernel,
+    half_turn_reachable_kernel,
+    turn_reachable_kernel,
+)
+from tools.jit import njit, NUMBA_AVAILABLE
 from tools.movement import Direction, Motion
 from tools.consts import (
     MOVE_DIRECTION,
     TURN_FACTOR,
     HALF_TURN_FACTOR,
-    ITERATIONS,
     TURN_RADIUS,
     SAFE_COST,
     TURNS,
@@ -19,6 +25,422 @@ from tools.consts import (
     REVERSE_FACTOR,
 )
 
+# directions indexed by their value
+DIRECTIONS = (Direction.NORTH, Direction.SOUTH, Direction.EAST, Direction.WEST)
+
+# displacement (dx, dy) of a forward half turn, indexed by the value of the direction
+HALF_TURN_DISPLACEMENT = (
+    (HALF_TURNS[1], HALF_TURNS[0]),  # NORTH
+    (-HALF_TURNS[1], -HALF_TURNS[0]),  # SOUTH
+    (HALF_TURNS[0], HALF_TURNS[1]),  # EAST
+    (-HALF_TURNS[0], -HALF_TURNS[1]),  # WEST
+)
+
+# kinds of reachability checks used by the move table
+STRAIGHT, HALF_TURN, TURN = 0, 1, 2
+
+# columns of the compiled neighbor table
+DX, DY, NEW_DIR, MOTION_ID, EXTRA_COST, KIND, MOTION_COST = range(7)
+
+
+def _build_cost_tables() -> tuple:
+    """
+    Precompute the rotation, reverse and half turn costs used by MazeSolver._get_motion_cost.
+
+    ROT_COST[direction, new_direction], REV_COST[motion] and HALF_COST[motion], indexed by the enum values
+    """
+    # the robot cannot turn to the opposite direction, those entries are never looked up
+    rot_cost = np.zeros((4, 4), dtype=np.int32)
+    for d1 in DIRECTIONS:
+        for d2 in DIRECTIONS:
+            if d1 != d2 and int(d1) // 2 == int(d2) // 2:
+                continue
+            rot_cost[d1, d2] = Direction.rotation_cost(d1, d2)
+
+    # capture is not a movement between cells, so it has no costs
+    motions = [motion for motion in Motion if motion != Motion.CAPTURE]
+    rev_cost = np.zeros(max(motions) + 1, dtype=np.int32)
+    half_cost = np.zeros(max(motions) + 1, dtype=np.int32)
+    for motion in motions:
+        rev_cost[motion] = motion.reverse_cost()
+        half_cost[motion] = motion.half_turn_cost()
+
+    return rot_cost, rev_cost, half_cost
+
+
+def _build_capture_position_table() -> tuple:
+    """
+    Build the table used by MazeSolver._get_capture_relative_position.
+
+    CAPTURE_POSITION_TABLE[direction][sign_x + 1][sign_y + 1] is L, R or C, where sign_x and sign_y are the signs of the
+    offset from the robot to the obstacle. The obstacle is in the centre (C) if it is straight ahead of the robot.
+    """
+
+    def position(direction, sign_x, sign_y):
+        if direction == Direction.NORTH:
+            if sign_x == 0 and sign_y > 0:
+                return "C"
+            return "L" if sign_x < 0 else "R"
+        elif direction == Direction.SOUTH:
+            if sign_x == 0 and sign_y < 0:
+                return "C"
+            return "R" if sign_x < 0 else "L"
+        elif direction == Direction.EAST:
+            if sign_y == 0 and sign_x > 0:
+                return "C"
+            return "R" if sign_y < 0 else "L"
+        else:
+            # WEST
+            if sign_y == 0 and sign_x < 0:
+                return "C"
+            return "L" if sign_y < 0 else "R"
+
+    return tuple(
+        tuple(
+            tuple(position(direction, sign_x, sign_y) for sign_y in (-1, 0, 1))
+            for sign_x in (-1, 0, 1)
+        )
+        for direction in DIRECTIONS
+    )
+
+
+def _build_move_table() -> tuple:
+    """
+    Build the static table of all the transitions the robot can make from each direction.
+
+    MOVE_TABLE[direction] = ((dx, dy, new_direction, motion, extra safe cost, reachability kind, motion cost), ...)
+    Every direction has the same 10 transitions: forward, reverse, 4 half turns and 4 turns (forward and reverse to
+    each perpendicular direction). Turns have an extra safe cost of 10.
+    """
+    big, small = TURNS
+    turns = {
+        # (direction, new direction): [(dx, dy, motion), ...]
+        (Direction.NORTH, Direction.EAST): [
+            (big, small, Motion.FORWARD_RIGHT_TURN),
+            (-small, -big, Motion.REVERSE_LEFT_TURN),
+        ],
+        (Direction.EAST, Direction.NORTH): [
+            (small, big, Motion.FORWARD_LEFT_TURN),
+            (-big, -small, Motion.REVERSE_RIGHT_TURN),
+        ],
+        (Direction.EAST, Direction.SOUTH): [
+            (small, -big, Motion.FORWARD_RIGHT_TURN),
+            (-big, small, Motion.REVERSE_LEFT_TURN),
+        ],
+        (Direction.SOUTH, Direction.EAST): [
+            (big, -small, Motion.FORWARD_LEFT_TURN),
+            (-small, big, Motion.REVERSE_RIGHT_TURN),
+        ],
+        (Direction.SOUTH, Direction.WEST): [
+            (-big, -small, Motion.FORWARD_RIGHT_TURN),
+            (small, big, Motion.REVERSE_LEFT_TURN),
+        ],
+        (Direction.WEST, Direction.SOUTH): [
+            (-small, -big, Motion.FORWARD_LEFT_TURN),
+            (big, small, Motion.REVERSE_RIGHT_TURN),
+        ],
+        (Direction.WEST, Direction.NORTH): [
+            (-small, big, Motion.FORWARD_RIGHT_TURN),
+            (big, -small, Motion.REVERSE_LEFT_TURN),
+        ],
+        (Direction.NORTH, Direction.WEST): [
+            (-big, small, Motion.FORWARD_LEFT_TURN),
+            (small, -big, Motion.REVERSE_RIGHT_TURN),
+        ],
+    }
+
+    # indexed by the value of the direction
+    table = [None] * 4
+    for direction in [Direction.NORTH, Direction.SOUTH, Direction.EAST, Direction.WEST]:
+        moves = []
+        for dx, dy, md in MOVE_DIRECTION:
+            if md == direction:
+                # FORWARD and REVERSE
+                moves.append((dx, dy, md, Motion.FORWARD, 0, STRAIGHT))
+                moves.append((-dx, -dy, md, Motion.REVERSE, 0, STRAIGHT))
+
+                # half turns
+                delta_x, delta_y = MazeSolver._get_half_turn_displacement(direction)
+                if int(direction) < 2:
+                    # NORTH or SOUTH
+                    half_turns = [
+                        (delta_x, delta_y, Motion.FORWARD_OFFSET_RIGHT),
+                        (-delta_x, delta_y, Motion.FORWARD_OFFSET_LEFT),
+                        (delta_x, -delta_y, Motion.REVERSE_OFFSET_RIGHT),
+                        (-delta_x, -delta_y, Motion.REVERSE_OFFSET_LEFT),
+                    ]
+                else:
+                    # EAST or WEST
+                    half_turns = [
+                        (delta_x, -delta_y, Motion.FORWARD_OFFSET_RIGHT),
+                        (delta_x, delta_y, Motion.FORWARD_OFFSET_LEFT),
+                        (-delta_x, -delta_y, Motion.REVERSE_OFFSET_RIGHT),
+                        (-delta_x, delta_y, Motion.REVERSE_OFFSET_LEFT),
+                    ]
+                for hx, hy, motion in half_turns:
+                    moves.append((hx, hy, md, motion, 0, HALF_TURN))
+            else:
+                # turns to the perpendicular directions
+                for tx, ty, motion in turns.get((direction, md), []):
+                    moves.append((tx, ty, md, motion, 10, TURN))
+
+        # the motion cost only depends on the transition, so it is computed once here
+        table[int(direction)] = tuple(
+            move + (MazeSolver._get_motion_cost(direction, move[2], move[3]),)
+            for move in moves
+        )
+    return tuple(table)
+
+
+def _build_predecessor_table(move_table: tuple) -> tuple:
+    """
+    Invert the move table, for searching backwards from a state.
+
+    PREDECESSOR_TABLE[new_direction] = ((dx, dy, direction, motion, extra safe cost, reachability kind, motion cost), ...)
+    The entries are the moves of MOVE_TABLE[direction] that end in new_direction, so the previous state of a state at
+    (x, y) is at (x - dx, y - dy).
+    """
+    table = [[] for _ in range(4)]
+    for direction in range(4):
+        for dx, dy, new_direction, motion, extra_cost, kind, cost in move_table[
+            direction
+        ]:
+            table[int(new_direction)].append(
+                (dx, dy, DIRECTIONS[direction], motion, extra_cost, kind, cost)
+            )
+    return tuple(tuple(moves) for moves in table)
+
+
+def _build_neighbor_deltas(move_table: tuple) -> np.ndarray:
+    """
+    Build the neighbor table used by the compiled A* search from the move table.
+
+    NEIGHBOR_DELTAS[direction][k] = (dx, dy, new_direction, motion, extra safe cost, reachability kind, motion cost)
+    """
+    table = np.zeros((4, len(move_table[0]), 7), dtype=np.int32)
+    for direction, moves in enumerate(move_table):
+        for k, (dx, dy, md, motion, extra, kind, motion_cost) in enumerate(moves):
+            table[direction, k] = (
+                dx,
+                dy,
+                int(md),
+                int(motion),
+                extra,
+                kind,
+                motion_cost,
+            )
+    return table
+
+
+@njit(cache=True)
+def _nb_heap_push(heap, size, key):
+    # sift up
+    i = size
+    heap[i] = key
+    while i > 0:
+        p = (i - 1) >> 1
+        if heap[p] <= heap[i]:
+            break
+        heap[p], heap[i] = heap[i], heap[p]
+        i = p
+    return size + 1
+
+
+@njit(cache=True)
+def _nb_heap_pop(heap, size):
+    # returns the smallest key, sifting down the last element
+    top = heap[0]
+    size -= 1
+    heap[0] = heap[size]
+    i = 0
+    while True:
+        left = 2 * i + 1
+        if left >= size:
+            break
+        child = left
+        if left + 1 < size and heap[left + 1] < heap[left]:
+            child = left + 1
+        if heap[i] <= heap[child]:
+            break
+        heap[i], heap[child] = heap[child], heap[i]
+        i = child
+    return top, size
+
+
+@njit(cache=True)
+def _held_karp_numba(cost_matrix, cluster_start, penalties):
+    """
+    Compiled version of MazeSolver._solve_cluster_tsp. Cluster c is the range of states
+    [cluster_start[c], cluster_start[c + 1]), and state 0 is the start state.
+
+    :return: the route as an array of state indices starting with 0 (empty if there is no route), and its cost
+    """
+    num_states = cost_matrix.shape[0]
+    num_clusters = cluster_start.shape[0] - 1
+    num_masks = 1 << num_clusters
+
+    dp = np.full((num_masks, num_states), np.inf)
+    parent = np.zeros((num_masks, num_states), dtype=np.int64)
+    cluster_of = np.zeros(num_states, dtype=np.int64)
+
+    # routes with no clusters visited stay at the start state
+    dp[0, 0] = 0.0
+    for c in range(num_clusters):
+        for v in range(cluster_start[c], cluster_start[c + 1]):
+            cluster_of[v] = c
+            dp[1 << c, v] = cost_matrix[0, v] + penalties[v]
+
+    for mask in range(3, num_masks):
+        # single cluster masks have already been initialized
+        if mask & (mask - 1) == 0:
+            continue
+
+        for c in range(num_clusters):
+            if not mask & (1 << c):
+                continue
+
+            # extend the routes over the other clusters with a state of cluster c
+            prev_mask = mask ^ (1 << c)
+            for v in range(cluster_start[c], cluster_start[c + 1]):
+                best_cost = np.inf
+                best = 0
+                for u in range(num_states):
+                    total = dp[prev_mask, u] + cost_matrix[u, v]
+                    if total < best_cost:
+                        best_cost = total
+                        best = u
+                dp[mask, v] = best_cost + penalties[v]
+                parent[mask, v] = best
+
+    # walk back from the cheapest state of the route visiting every cluster
+    mask = num_masks - 1
+    last = 0
+    for v in range(num_states):
+        if dp[mask, v] < dp[mask, last]:
+            last = v
+    distance = dp[mask, last]
+    if distance == np.inf:
+        # some cluster has no states
+        return np.zeros(0, dtype=np.int64), distance
+
+    route = np.zeros(num_clusters + 1, dtype=np.int64)
+    k = num_clusters
+    route[k] = last
+    while mask:
+        prev = parent[mask, last]
+        mask ^= 1 << cluster_of[last]
+        last = prev
+        k -= 1
+        route[k] = last
+
+    return route, distance
+
+
+@njit(cache=True, nogil=True)
+def _astar_numba(
+    sx,
+    sy,
+    sd,
+    ex,
+    ey,
+    ed,
+    penalty,
+    obstacles_xy,
+    danger,
+    size_x,
+    size_y,
+    neighbor_deltas,
+):
+    """
+    Compiled version of MazeSolver._astar_search.
+
+    States are encoded as idx = (x * size_y + y) * 4 + direction. Heap entries pack (f << 32) | idx into a single
+    int64 so that they are ordered the same way as the (f, x, y, direction) tuples of the python version.
+
+    :return: cost (-1 if the end state cannot be reached), the states of the path and the motion ids between them
+    """
+    num_states = size_x * size_y * 4
+    inf = np.iinfo(np.int64).max
+    g_dist = np.full(num_states, inf, np.int64)
+    parent = np.full(num_states, -1, np.int32)
+    parent_motion = np.full(num_states, -1, np.int32)
+    visited = np.zeros(num_states, np.bool_)
+    heap = np.empty(num_states * neighbor_deltas.shape[1] + 1, np.int64)
+
+    start_idx = (sx * size_y + sy) * 4 + sd
+    end_idx = (ex * size_y + ey) * 4 + ed
+    g_dist[start_idx] = 0
+    size = _nb_heap_push(heap, 0, ((abs(sx - ex) + abs(sy - ey)) << 32) | start_idx)
+
+    while size > 0:
+        key, size = _nb_heap_pop(heap, size)
+        idx = key & 0xFFFFFFFF
+        if visited[idx]:
+            continue
+
+        if idx == end_idx:
+            # walk the parent pointers back to the start state
+            length = 1
+            node = idx
+            while parent[node] != -1:
+                node = parent[node]
+                length += 1
+            states = np.empty(length, np.int32)
+            motions = np.empty(length - 1, np.int32)
+            node = idx
+            for i in range(length - 1, -1, -1):
+                states[i] = node
+                if i > 0:
+                    motions[i - 1] = parent_motion[node]
+                node = parent[node]
+            return g_dist[idx], states, motions
+
+        visited[idx] = True
+        dist = g_dist[idx]
+        direction = idx & 3
+        x = (idx >> 2) // size_y
+        y = (idx >> 2) % size_y
+
+        for k in range(neighbor_deltas.shape[1]):
+            row = neighbor_deltas[direction, k]
+            new_x = x + row[0]
+            new_y = y + row[1]
+            new_direction = row[2]
+            kind = row[5]
+
+            if kind == 0:
+                ok = reachable_kernel(new_x, new_y, obstacles_xy, size_x, size_y)
+            elif kind == 1:
+                ok = half_turn_reachable_kernel(
+                    x, y, new_x, new_y, obstacles_xy, size_x, size_y
+                )
+            else:
+                ok = turn_reachable_kernel(
+                    x, y, new_x, new_y, direction, obstacles_xy, size_x, size_y
+                )
+            if not ok:
+                continue
+
+            new_idx = (new_x * size_y + new_y) * 4 + new_direction
+            if visited[new_idx]:
+                continue
+
+            safe_cost = SAFE_COST if danger[new_x, new_y] else 0
+            movement_cost = row[6] + safe_cost + row[4]
+            screenshot_cost = penalty if new_idx == end_idx else 0
+
+            # the screenshot penalty is part of the cost of the end state, so a path to the end state only replaces
+            # the stored one if it is cheaper including the penalty
+            new_dist = dist + movement_cost + screenshot_cost
+            if g_dist[new_idx] > new_dist:
+                g_dist[new_idx] = new_dist
+                total_cost = new_dist + abs(new_x - ex) + abs(new_y - ey)
+                size = _nb_heap_push(heap, size, (total_cost << 32) | new_idx)
+                parent[new_idx] = idx
+                parent_motion[new_idx] = row[3]
+
+    return -1, np.empty(0, np.int32), np.empty(0, np.int32)
+
 
 class MazeSolver:
     """
@@ -49,7 +471,49 @@ class MazeSolver:
 
         self.path_table = dict()
         self.cost_table = dict()
+        # motion ids (Motion values) keyed by packed (from, to) state indices
         self.motion_table = dict()
+        # motion paths and obstacle ids of previously converted optimal paths (see optimal_path_to_motion_path)
+        self.motion_path_cache = dict()
+        # obstacle version of the grid the tables were filled for (see _reset_tables)
+        self._tables_version = self.grid.obstacle_version
+        # (x, y, direction) rows of the last optimal path, kept alongside its cell states (see get_optimal_path)
+        self.optimal_path_xyd = np.zeros((0, 3), dtype=np.int32)
+        self._optimal_path = None
+
+        # per state buffers of the python A* search, indexed by state index (see _state_index)
+        # they are allocated once and only the entries touched by a search (self._dirty) are reset after it
+        num_states = size_x * size_y * 4
+        self._g_f = [math.inf] * num_states
+        self._g_b = [math.inf] * num_states
+        self._visited_f = bytearray(num_states)
+        self._visited_b = bytearray(num_states)
+        self._parent_f = [-1] * num_states
+        self._child_b = [-1] * num_states
+        self._dirty = []
+
+    def _state_index(self, x: int, y: int, direction: Direction) -> int:
+        """
+        Pack a state into a single int, used to key the path, cost and motion tables.
+        Uses the same encoding as the compiled search, (x * size_y + y) * 4 + direction.
+        """
+        return ((x * self.grid.size_y) + y) * 4 + int(direction)
+
+    def _sidx(self, cell_state: CellState) -> int:
+        """
+        State index of a cell state (see _state_index)
+        """
+        return self._state_index(cell_state.x, cell_state.y, cell_state.direction)
+
+    def _reset_tables(self) -> None:
+        """
+        Clear the stored paths, costs and motions, as they are only valid for the current obstacles.
+        """
+        self.path_table.clear()
+        self.cost_table.clear()
+        self.motion_table.clear()
+        self.motion_path_cache.clear()
+        self._tables_version = self.grid.obstacle_version
 
     def add_obstacle(
         self, x: int, y: int, direction: Direction, obstacle_id: int
@@ -62,20 +526,36 @@ class MazeSolver:
         :param direction: direction that the image on the obstacle is facing
         :param obstacle_id: id of the obstacle
         """
-        self.grid.add_obstacle(Obstacle(x, y, direction, obstacle_id))
+        self.add_obstacles([(x, y, direction, obstacle_id)])
+
+    def add_obstacles(self, obstacles: list) -> None:
+        """
+        Add a list of obstacles to the grid, resetting the tables once for the whole list
+
+        :param obstacles: list of (x, y, direction, obstacle_id) tuples, see add_obstacle
+        """
+        self.grid.add_obstacles_bulk([Obstacle(*obstacle) for obstacle in obstacles])
+        self._reset_tables()
 
     def clear_obstacles(self) -> None:
         """
         Removes all obstacles from the grid
         """
         self.grid.reset_obstacles()
+        self._reset_tables()
 
     def get_optimal_path(self):
         """
-        Get the optimal path from the using dynamic programming
+        Get the optimal path from the using dynamic programming over the obstacles and their views (see
+        _solve_cluster_tsp)
 
         :return: An Optimal path, which is a list of all the CellStates involved and cost of the path
         """
+        # the obstacles may also have been changed through the grid, the stored paths are only valid for the obstacles
+        # they were found with
+        if self._tables_version != self.grid.obstacle_version:
+            self._reset_tables()
+
         min_dist = 1e9
         optimal_path = []
 
@@ -83,13 +563,13 @@ class MazeSolver:
         views = self.grid.get_view_obstacle_positions()
         num_views = len(views)
 
-        for bin_pos in self._get_visit_options(num_views):
+        for visit_mask in self._get_visit_options(num_views):
             visit_states = [self.robot.get_start_state()]
             cur_view_positions = []
 
             for i in range(num_views):
                 # if the i-th bit is 1, then the robot will visit the i-th view position
-                if bin_pos[i] == "1":
+                if visit_mask >> (num_views - 1 - i) & 1:
                     # add the view position to the current view positions
                     cur_view_positions.append(views[i])
                     # add the view position to the visit states
@@ -98,105 +578,216 @@ class MazeSolver:
             # for each visit state, generate paths and cost of the paths using A* search
             self._generate_paths(visit_states)
 
-            # generate all possible combinations of the view positions
-            combinations = MazeSolver._generate_combinations(
-                cur_view_positions, 0, [], [], ITERATIONS
+            # state indices of the visit states, used to look up the cost and path tables
+            sidx = [self._sidx(state) for state in visit_states]
+
+            # the views of each obstacle form a cluster of visit state indices, the start state is index 0
+            clusters = []
+            current_idx = 1
+            for view_pos in cur_view_positions:
+                clusters.append(list(range(current_idx, current_idx + len(view_pos))))
+                current_idx += len(view_pos)
+
+            # fill the cost matrix over all the visit states from the upper triangle of pairs
+            # pairs whose cost has not been calculated get a large value
+            rows, cols = np.triu_indices(len(visit_states), k=1)
+            cost_matrix = np.zeros((len(visit_states), len(visit_states)))
+            cost_matrix[rows, cols] = [
+                self.cost_table.get((sidx[i] << 20) | sidx[j], 1e9)
+                for i, j in zip(rows.tolist(), cols.tolist())
+            ]
+
+            # add the cost for the reverse paths
+            cost_matrix[cols, rows] = cost_matrix[rows, cols]
+
+            # screenshot penalty of each visit state
+            penalties = np.array([0] + [state.penalty for state in visit_states[1:]])
+
+            # pick one view per obstacle and the order to visit them in a single pass
+            route, distance = MazeSolver._solve_cluster_tsp(
+                cost_matrix, clusters, penalties
             )
 
-            # iterate over all the combinations and find the optimal path
-            for combination in combinations:
-                visited = [0]
+            # if the distance is more than the minimum distance, the path is irrelevant.
+            if distance >= min_dist:
+                continue
 
-                current_idx, cost = 1, 0
+            # update the minimum distance and the optimal path
+            min_dist = distance
 
-                # iterate over the views and calculate the cost of the path
-                for idx, view_pos in enumerate(cur_view_positions):
-                    visited.append(current_idx + combination[idx])
-                    cost += view_pos[combination[idx]].penalty
-                    current_idx += len(view_pos)
+            # generate the optimal path as an (n, 3) array of (x, y, direction) rows from the paths between the states
+            # of the route, the start row comes from the start state
+            start_state = visit_states[0]
+            segments = [
+                np.array(
+                    [[start_state.x, start_state.y, int(start_state.direction)]],
+                    dtype=np.int32,
+                )
+            ]
+            for from_idx, to_idx in zip(route, route[1:]):
+                segments.append(
+                    self.path_table[(sidx[from_idx] << 20) | sidx[to_idx]][1:]
+                )
+            path_xyd = np.concatenate(segments)
+
+            optimal_path = [start_state] + [
+                CellState(x, y, DIRECTIONS[direction])
+                for x, y, direction in path_xyd[1:].tolist()
+            ]
+            self.optimal_path_xyd = path_xyd
+            self._optimal_path = optimal_path
+
+            # the last state of each path takes the screenshot
+            end = 0
+            for to_idx, segment in zip(route[1:], segments[1:]):
+                end += len(segment)
+                to_state = visit_states[to_idx]
+
+                # check position of to_state wrt to obstacle. If it is directly in front of the obstacle, add idC
+                # if it is to the left or right, add idL or idR
+                # the view states of an obstacle only have its id
+                obstacle_id = to_state.screenshot_id[0]
+                corresponding_obs = self.grid.find_obstacle_by_id(obstacle_id)
+                if corresponding_obs:
+                    pos = MazeSolver._get_capture_relative_position(
+                        optimal_path[end], corresponding_obs
+                    )
+                    formatted = f"{obstacle_id}_{pos}"
 
-                # initialize the cost matrix
-                cost_matrix = np.zeros((len(visited), len(visited)))
+                    optimal_path[end].add_screenshot(formatted)
+                else:
+                    raise ValueError(f"Obstacle with id {obstacle_id} not found")
 
-                for start_idx in range(len(visited) - 1):
-                    for end_idx in range(start_idx + 1, len(visited)):
-                        start_state = visit_states[visited[start_idx]]
-                        end_state = visit_states[visited[end_idx]]
+            # if the optimal path has been found, break the view positions loop
+            if optimal_path:
+                break
 
-                        # check if the cost has already been calculated
-                        if (start_state, end_state) in self.cost_table:
-                            cost_matrix[start_idx, end_idx] = self.cost_table[
-                                (start_state, end_state)
-                            ]
-                        else:
-                            # initialize the cost matrix with a large value since the cost has not been calculated
-                            cost_matrix[start_idx, end_idx] = 1e9
+        return optimal_path, min_dist
 
-                        # add the cost for the reverse path
-                        cost_matrix[end_idx, start_idx] = cost_matrix[
-                            start_idx, end_idx
-                        ]
+    @staticmethod
+    def _solve_cluster_tsp(cost_matrix: np.ndarray, clusters: list, penalties):
+        """
+        Find the cheapest route from the start state (index 0) that visits exactly one state of every cluster, using
+        the Held-Karp dynamic programming over subsets of clusters. The route does not return to the start state.
 
-                # set the cost of travelling from each state to itself to 0
-                cost_matrix[:, 0] = 0
+        dp[mask, v]: cost of the cheapest route that visits one state of each cluster in mask and ends at state v,
+        including the penalty of every state visited.
 
-                # solve the TSP problem using dynamic programming
-                permutation, distance = solve_tsp_dynamic_programming(cost_matrix)
+        :param cost_matrix: cost of travelling between every pair of states
+        :param clusters: list of the state indices of each cluster
+        :param penalties: penalty of visiting each state
+        :return: the route as a list of state indices starting with 0, and its cost (inf if there is no route)
+        """
+        if NUMBA_AVAILABLE:
+            # the clusters are consecutive ranges of states, given to the compiled version by their first states
+            cluster_start = np.array(
+                [states[0] if states else 0 for states in clusters]
+                + [len(cost_matrix)],
+                dtype=np.int64,
+            )
+            for c in range(len(clusters) - 1, -1, -1):
+                if not clusters[c]:
+                    # empty clusters start where the next cluster starts
+                    cluster_start[c] = cluster_start[c + 1]
+            route, distance = _held_karp_numba(
+                cost_matrix, cluster_start, penalties.astype(np.float64)
+            )
+            return route.tolist(), distance
 
-                # if the distancd is more than the minimum distance, the path is irrelevant.
-                if distance + cost >= min_dist:
-                    continue
+        num_clusters = len(clusters)
+        num_masks = 1 << num_clusters
 
-                # update the minimum distance and the optimal path
-                min_dist = distance + cost
+        dp = np.full((num_masks, len(cost_matrix)), np.inf)
+        parent = np.zeros((num_masks, len(cost_matrix)), dtype=np.int64)
+        cluster_of = np.zeros(len(cost_matrix), dtype=np.int64)
 
-                optimal_path = [visit_states[0]]
-                # generate the optimal path
-                for idx in range(len(permutation) - 1):
-                    from_state = visit_states[visited[permutation[idx]]]
-                    to_state = visit_states[visited[permutation[idx + 1]]]
+        # routes with no clusters visited stay at the start state
+        dp[0, 0] = 0
+        for c, states in enumerate(clusters):
+            cluster_of[states] = c
+            dp[1 << c, states] = cost_matrix[0, states] + penalties[states]
 
-                    current_path = self.path_table[(from_state, to_state)]
+        for mask in range(3, num_masks):
+            # single cluster masks have already been initialized
+            if mask & (mask - 1) == 0:
+                continue
 
-                    # add each state from the current path to the optimal path
-                    for idx2 in range(1, len(current_path)):
-                        optimal_path.append(
-                            CellState(
-                                current_path[idx2][0],
-                                current_path[idx2][1],
-                                current_path[idx2][2],
-                            )
-                        )
-                    # check position of to_state wrt to obstacle. If it is directly in front of the obstacle, add idC
-                    # if it is to the left or right, add idL or idR
-                    corresponding_obs = self.grid.find_obstacle_by_id(
-                        to_state.screenshot_id
-                    )
-                    if corresponding_obs:
-                        pos = MazeSolver._get_capture_relative_position(
-                            optimal_path[-1], corresponding_obs
-                        )
-                        formatted = f"{to_state.screenshot_id}_{pos}"
-
-                        optimal_path[-1].add_screenshot(formatted)
-                    else:
-                        raise ValueError(
-                            f"Obstacle with id {to_state.screenshot_id} not found"
-                        )
+            for c, states in enumerate(clusters):
+                if not mask & (1 << c):
+                    continue
 
-            # if the optimal path has been found, break the view positions loop
-            if optimal_path:
-                break
+                # extend the routes over the other clusters with a state of cluster c
+                # states outside the previous mask have an infinite cost, so they are never picked
+                totals = dp[mask ^ (1 << c)][:, None] + cost_matrix[:, states]
+                best = np.argmin(totals, axis=0)
+                dp[mask, states] = (
+                    totals[best, np.arange(len(states))] + penalties[states]
+                )
+                parent[mask, states] = best
 
-        return optimal_path, min_dist
+        # walk back from the cheapest state of the route visiting every cluster
+        mask = num_masks - 1
+        last = int(np.argmin(dp[mask]))
+        distance = dp[mask, last]
+        if distance == np.inf:
+            # some cluster has no states
+            return [], distance
+
+        route = [last]
+        while mask:
+            mask, last = mask ^ (1 << cluster_of[last]), int(parent[mask, last])
+            route.append(last)
+
+        return route[::-1], distance
 
     def _generate_paths(self, states) -> int:
         """
         Generate and store the path between all states in a list of states using astar search
+
+        Without numba, the paths from a state to all of the later states are found with a single search (see
+        _dijkstra_multi). The searches are independent of each other. With numba, the compiled search releases the GIL, so the searches
+        run in parallel on a thread pool and their results are stored in the same order as a sequential run.
         """
+        sidx = [self._sidx(state) for state in states]
+
+        # collect the pairs whose path has not been calculated yet
+        pairs = []
+        pending = set()
         for i in range(len(states) - 1):
             for j in range(i + 1, len(states)):
-                self._astar_search(states[i], states[j])
+                key = (sidx[i] << 20) | sidx[j]
+                # skip the pairs whose path has already been calculated
+                if key in self.path_table or key in pending:
+                    continue
+                pending.add(key)
+                pending.add((sidx[j] << 20) | sidx[i])
+                pairs.append((states[i], states[j]))
+
+        if not NUMBA_AVAILABLE:
+            # search from each start state to all of its end states at once
+            targets = dict()
+            for start, end in pairs:
+                targets.setdefault(self._sidx(start), (start, []))[1].append(end)
+            for start, ends in targets.values():
+                if len(ends) == 1:
+                    self._astar_search(start, ends[0])
+                else:
+                    self._dijkstra_multi(start, ends)
+            return
+
+        if len(pairs) < 2:
+            for start, end in pairs:
+                self._astar_search(start, end)
+            return
+
+        obstacles_xy = self._obstacles_xy()
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            results = executor.map(
+                lambda pair: self._run_astar_numba(pair[0], pair[1], obstacles_xy),
+                pairs,
+            )
+            for (start, end), result in zip(pairs, results):
+                self._store_numba_result(start, end, *result)
 
     def _astar_search(self, start: CellState, end: CellState) -> None:
         """
@@ -206,569 +797,681 @@ class MazeSolver:
         Heuristic: distance f = g + h
         g: Actual distance from the start state to the current state
         h: Estimated distance from the current state to the end state
+
+        The pure python search is bidirectional: a forward search from the start state and a backward search from the
+        end state (with the distance to the start state as its heuristic) are expanded alternately, and the search
+        stops once neither side can improve on the cheapest path through a state reached by both.
         """
         # check if the path has already been calculated
 
-        if (start, end) in self.path_table:
+        if (self._sidx(start) << 20) | self._sidx(end) in self.path_table:
             return
 
-        # initialize the actual distance dict with the start state
-        g_dist = {(start.x, start.y, start.direction): 0}
+        # use the compiled search if numba is installed
+        if NUMBA_AVAILABLE:
+            self._astar_search_numba(start, end)
+            return
 
-        # initialize min heap with the start state
-        # the heap is a list of tuples (h, x, y, direction) where h is the estimated distance from the current state to the end state
-        heap = [
-            (self._estimate_distance(start, end), start.x, start.y, start.direction)
-        ]
+        # start and end state as locals since they are compared against every expanded state
+        sx, sy = start.x, start.y
+        ex, ey = end.x, end.y
+        end_cells = {(ex, ey)}
+        size_y = self.grid.size_y
 
-        visited = set()
-        parent_dict = dict()
+        # states are packed into ints (see _state_index)
+        start_idx = self._sidx(start)
+        end_idx = self._sidx(end)
 
-        while heap:
-            # get the node with the minimum estimated distance
-            _, x, y, direction = heapq.heappop(heap)
+        if start_idx == end_idx:
+            # the robot is already at the end state
+            self._store_path(start, end, [start_idx], 0)
+            return
 
-            # check if the node has already been visited
-            if (x, y, direction) in visited:
-                continue
+        # the forward search runs from the start state and the backward search from the end state
+        # g_b is the cost from a state to the end state, child_b the next state on the way to the end state
+        g_f, g_b = self._g_f, self._g_b
+        visited_f, visited_b = self._visited_f, self._visited_b
+        parent_f, child_b = self._parent_f, self._child_b
+        dirty = self._dirty
+
+        # bound methods as locals, they are called for every expanded state
+        jump_neighbors = self._get_jump_neighbors
+        predecessor_states = self._get_predecessor_states
+        store_motion = self._store_motion
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        g_f[start_idx] = 0
+        g_b[end_idx] = 0
+        dirty.append(start_idx)
+        dirty.append(end_idx)
+
+        # initialize the bucket queues with the start and end states
+        # buckets[f] holds the states with an estimated total cost of f. Each bucket is a heap of state indices, so
+        # that ties are broken by (x, y, direction), the same order as a heap of (f, x, y, direction) tuples.
+        # Since the heuristics are consistent, f never decreases and the min buckets only move forward.
+        min_f = min_b = self._estimate_distance(sx, sy, ex, ey)
+        buckets_f = [[] for _ in range(min_f + 1)]
+        buckets_f[min_f].append(start_idx)
+        buckets_b = [[] for _ in range(min_b + 1)]
+        buckets_b[min_b].append(end_idx)
+
+        # cheapest path found so far, through the meeting state
+        best_cost = math.inf
+        meeting_idx = None
+
+        forward = True
+        while True:
+            # advance to the first non-empty bucket of each side
+            while min_f < len(buckets_f) and not buckets_f[min_f]:
+                min_f += 1
+            while min_b < len(buckets_b) and not buckets_b[min_b]:
+                min_b += 1
+
+            # stop if either side has run out of states, or if no unexpanded state can lead to a cheaper path
+            if (
+                min_f == len(buckets_f)
+                or min_b == len(buckets_b)
+                or best_cost <= max(min_f, min_b)
+            ):
+                break
 
-            # if the terminal state is reached record the path and return
-            if end.is_eq(x, y, direction):
-                self._record_path(start, end, parent_dict, g_dist[(x, y, direction)])
-                return
+            if forward:
+                idx = heappop(buckets_f[min_f])
+                if not visited_f[idx]:
+                    visited_f[idx] = 1
+                    dist = g_f[idx]
+                    x, y, direction = (
+                        (idx >> 2) // size_y,
+                        (idx >> 2) % size_y,
+                        DIRECTIONS[idx & 3],
+                    )
 
-            # mark the node as visited
-            visited.add((x, y, direction))
-            dist = g_dist[(x, y, direction)]
+                    # traverse the neighboring states, with straight moves jumping along corridors
+                    for (
+                        new_x,
+                        new_y,
+                        new_direction,
+                        movement_cost,
+                        motion,
+                        steps,
+                    ) in jump_neighbors(x, y, direction, end_cells):
+                        new_idx = ((new_x * size_y) + new_y) * 4 + new_direction
+
+                        # check if the new state has already been visited
+                        if visited_f[new_idx]:
+                            continue
+
+                        # a jump covers one straight step per cell, store the motion of each of them
+                        step = (new_idx - idx) // steps
+                        for i in range(steps):
+                            store_motion(idx + i * step, idx + (i + 1) * step, motion)
+
+                        new_dist = dist + movement_cost
+                        if g_f[new_idx] > new_dist:
+                            g_f[new_idx] = new_dist
+                            dirty.append(new_idx)
+
+                            # add the new state to its bucket
+                            # h is the manhattan distance (see _estimate_distance), inlined
+                            total_cost = (
+                                new_dist
+                                + (new_x - ex if new_x >= ex else ex - new_x)
+                                + (new_y - ey if new_y >= ey else ey - new_y)
+                            )
+                            if total_cost >= len(buckets_f):
+                                buckets_f.extend(
+                                    [] for _ in range(total_cost + 1 - len(buckets_f))
+                                )
+                            heappush(buckets_f[total_cost], new_idx)
+
+                            # update the parent
+                            parent_f[new_idx] = idx
+
+                            # check if the two searches meet at the new state
+                            if new_dist + g_b[new_idx] < best_cost:
+                                best_cost = new_dist + g_b[new_idx]
+                                meeting_idx = new_idx
+            else:
+                idx = heappop(buckets_b[min_b])
+                if not visited_b[idx]:
+                    visited_b[idx] = 1
+                    dist = g_b[idx]
+                    x, y, direction = (
+                        (idx >> 2) // size_y,
+                        (idx >> 2) % size_y,
+                        DIRECTIONS[idx & 3],
+                    )
+
+                    # traverse the states that can move to the current state
+                    for (
+                        prev_x,
+                        prev_y,
+                        prev_direction,
+                        movement_cost,
+                        motion,
+                    ) in predecessor_states(x, y, direction, sx, sy):
+                        prev_idx = ((prev_x * size_y) + prev_y) * 4 + prev_direction
+
+                        # check if the previous state has already been visited
+                        if visited_b[prev_idx]:
+                            continue
+
+                        store_motion(prev_idx, idx, motion)
+
+                        new_dist = dist + movement_cost
+                        if g_b[prev_idx] > new_dist:
+                            g_b[prev_idx] = new_dist
+                            dirty.append(prev_idx)
+
+                            # add the previous state to its bucket
+                            # h is the manhattan distance to the start (see _estimate_distance), inlined
+                            total_cost = (
+                                new_dist
+                                + (prev_x - sx if prev_x >= sx else sx - prev_x)
+                                + (prev_y - sy if prev_y >= sy else sy - prev_y)
+                            )
+                            if total_cost >= len(buckets_b):
+                                buckets_b.extend(
+                                    [] for _ in range(total_cost + 1 - len(buckets_b))
+                                )
+                            heappush(buckets_b[total_cost], prev_idx)
+
+                            # update the child
+                            child_b[prev_idx] = idx
+
+                            # check if the two searches meet at the previous state
+                            if new_dist + g_f[prev_idx] < best_cost:
+                                best_cost = new_dist + g_f[prev_idx]
+                                meeting_idx = prev_idx
+
+            # alternate between the two searches
+            forward = not forward
+
+        if meeting_idx is not None:
+            # join the two halves of the path at the meeting state
+            parent_dict = dict()
+            idx = meeting_idx
+            while idx != start_idx:
+                parent_dict[idx] = parent_f[idx]
+                idx = parent_f[idx]
+            idx = meeting_idx
+            while idx != end_idx:
+                parent_dict[child_b[idx]] = idx
+                idx = child_b[idx]
+
+            # the screenshot penalty is paid once the end state is reached
+            self._record_path(start, end, parent_dict, best_cost + end.penalty)
+
+        # reset the buffers for the next search
+        for idx in dirty:
+            g_f[idx] = g_b[idx] = math.inf
+            visited_f[idx] = visited_b[idx] = 0
+            parent_f[idx] = child_b[idx] = -1
+        dirty.clear()
+
+    def _dijkstra_multi(self, start: CellState, targets: list) -> None:
+        """
+        Dijkstra search from the start state to all the target states in a single pass, storing the path to each of
+        them in the path, cost and motion tables (same tables and buffers as _astar_search).
 
-            # traverse the neighboring states
+        There is no heuristic since there are multiple targets. The search stops once every target has been reached.
+        """
+        size_y = self.grid.size_y
+        start_idx = self._sidx(start)
+
+        # the states still to be reached, with the cells they are in for the jumps
+        remaining = {self._sidx(target): target for target in targets}
+        end_cells = {(target.x, target.y) for target in targets}
+
+        g_f, visited_f, parent_f = self._g_f, self._visited_f, self._parent_f
+        dirty = self._dirty
+        jump_neighbors = self._get_jump_neighbors
+        store_motion = self._store_motion
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        g_f[start_idx] = 0
+        dirty.append(start_idx)
+
+        # bucket queue indexed by g, each bucket is a heap of state indices (see _astar_search)
+        min_g = 0
+        buckets = [[start_idx]]
+
+        while remaining:
+            # advance to the first non-empty bucket
+            while min_g < len(buckets) and not buckets[min_g]:
+                min_g += 1
+            if min_g == len(buckets):
+                # the remaining targets cannot be reached
+                break
+
+            idx = heappop(buckets[min_g])
+            if visited_f[idx]:
+                continue
+            visited_f[idx] = 1
+            dist = g_f[idx]
+
+            # record the path to a target once it is reached
+            if idx in remaining:
+                target = remaining.pop(idx)
+                if idx == start_idx:
+                    self._store_path(start, target, [idx], 0)
+                else:
+                    # the screenshot penalty is paid once the target is reached
+                    self._record_path(start, target, parent_f, dist + target.penalty)
+
+            x, y, direction = (
+                (idx >> 2) // size_y,
+                (idx >> 2) % size_y,
+                DIRECTIONS[idx & 3],
+            )
+
+            # traverse the neighboring states, with straight moves jumping along corridors
             for (
                 new_x,
                 new_y,
                 new_direction,
-                safe_cost,
+                movement_cost,
                 motion,
-            ) in self._get_neighboring_states(x, y, direction):
+                steps,
+            ) in jump_neighbors(x, y, direction, end_cells):
+                new_idx = ((new_x * size_y) + new_y) * 4 + new_direction
 
                 # check if the new state has already been visited
-                if (new_x, new_y, new_direction) in visited:
+                if visited_f[new_idx]:
                     continue
 
-                if (
-                    x,
-                    y,
-                    direction,
-                    new_x,
-                    new_y,
-                    new_direction,
-                ) not in self.motion_table and (
-                    new_x,
-                    new_y,
-                    new_direction,
-                    x,
-                    y,
-                    direction,
-                ) not in self.motion_table:
-                    # only need to store one of the two directions as the other will be the opposite
-                    self.motion_table[
-                        (x, y, direction, new_x, new_y, new_direction)
-                    ] = motion
-
-                # calculate the cost of robot rotation
-                rotation_cost = TURN_FACTOR * Direction.rotation_cost(
-                    direction, new_direction
-                )
-                if rotation_cost == 0:
-                    rotation_cost = 1
+                # a jump covers one straight step per cell, store the motion of each of them
+                step = (new_idx - idx) // steps
+                for i in range(steps):
+                    store_motion(idx + i * step, idx + (i + 1) * step, motion)
 
-                # calculate the cost of robot reversing
-                reverse_cost = REVERSE_FACTOR * motion.reverse_cost()
-                if reverse_cost == 0:
-                    reverse_cost = 1
+                new_dist = dist + movement_cost
+                if g_f[new_idx] > new_dist:
+                    g_f[new_idx] = new_dist
+                    dirty.append(new_idx)
 
-                # calculate the cost of robot half-turning
-                half_turn_cost = HALF_TURN_FACTOR * motion.half_turn_cost()
-                if half_turn_cost == 0:
-                    half_turn_cost = 1
+                    # add the new state to its bucket
+                    if new_dist >= len(buckets):
+                        buckets.extend([] for _ in range(new_dist + 1 - len(buckets)))
+                    heappush(buckets[new_dist], new_idx)
 
-                motion_cost = reverse_cost * half_turn_cost * rotation_cost
+                    # update the parent
+                    parent_f[new_idx] = idx
 
-                # calculate the cost of robot rotation
-                movement_cost = motion_cost + safe_cost
+        # reset the buffers for the next search
+        for idx in dirty:
+            g_f[idx] = math.inf
+            visited_f[idx] = 0
+            parent_f[idx] = -1
+        dirty.clear()
 
-                # check if there is a screenshot penalty
-                if end.is_eq(new_x, new_y, new_direction):
-                    screenshot_cost = end.penalty
-                else:
-                    screenshot_cost = 0
-
-                # total cost f = g + h = safe_cost + rot_cost + screenshot_cost + dist + h (estimated distance)
-                total_cost = (
-                    dist
-                    + movement_cost
-                    + screenshot_cost
-                    + self._estimate_distance(
-                        CellState(new_x, new_y, new_direction), end
-                    )
+    def _astar_search_numba(self, start: CellState, end: CellState) -> None:
+        """
+        Run the compiled A* search (see _astar_numba) and store its result in the path, cost and motion tables.
+        """
+        cost, states, motions = self._run_astar_numba(start, end, self._obstacles_xy())
+        self._store_numba_result(start, end, cost, states, motions)
+
+    def _obstacles_xy(self) -> np.ndarray:
+        """
+        Obstacle positions as an int32 array of shape (n, 2), as expected by the compiled kernels
+        """
+        return self.grid._obs_xy
+
+    def _run_astar_numba(
+        self, start: CellState, end: CellState, obstacles_xy: np.ndarray
+    ):
+        """
+        Run the compiled A* search without touching any of the tables, so that it can be run from multiple threads
+        """
+        return _astar_numba(
+            start.x,
+            start.y,
+            int(start.direction),
+            end.x,
+            end.y,
+            int(end.direction),
+            end.penalty,
+            obstacles_xy,
+            self.grid.danger_mask(),
+            self.grid.size_x,
+            self.grid.size_y,
+            NEIGHBOR_DELTAS,
+        )
+
+    def _store_numba_result(
+        self,
+        start: CellState,
+        end: CellState,
+        cost: int,
+        states: np.ndarray,
+        motions: np.ndarray,
+    ) -> None:
+        """
+        Store the result of the compiled A* search in the path, cost and motion tables
+        """
+        if cost < 0:
+            # the end state cannot be reached
+            return
+
+        state_list = states.tolist()
+        for idx, motion_id in enumerate(motions.tolist()):
+            from_idx, to_idx = state_list[idx], state_list[idx + 1]
+            self._store_motion(from_idx, to_idx, motion_id)
+
+        self._store_path(start, end, states, int(cost))
+
+    def _decode_state(self, idx: int):
+        """
+        Convert a state index (see _state_index) back to a (x, y, direction) tuple
+        """
+        idx = int(idx)
+        return (
+            (idx >> 2) // self.grid.size_y,
+            (idx >> 2) % self.grid.size_y,
+            DIRECTIONS[idx & 3],
+        )
+
+    @staticmethod
+    def _get_motion_cost(
+        direction: Direction, new_direction: Direction, motion: Motion
+    ) -> int:
+        """
+        Cost of a motion, excluding the safe cost. The rotation, reverse and half turn costs are multiplied, with
+        each of them being 1 if it does not apply to the motion.
+        The costs are looked up from ROT_COST, REV_COST and HALF_COST. In the searches, the motion cost of every
+        transition is read from MOVE_TABLE instead.
+        """
+        # calculate the cost of robot rotation
+        rotation_cost = TURN_FACTOR * int(ROT_COST[direction, new_direction]) or 1
+
+        # calculate the cost of robot reversing
+        reverse_cost = REVERSE_FACTOR * int(REV_COST[motion]) or 1
+
+        # calculate the cost of robot half-turning
+        half_turn_cost = HALF_TURN_FACTOR * int(HALF_COST[motion]) or 1
+
+        return reverse_cost * half_turn_cost * rotation_cost
+
+    def _get_neighboring_states(self, x, y, direction):
+        """
+        Return a list of tuples with format:
+        newX, newY, new_direction, safe cost, motion, motion cost
+
+        The candidate transitions for each direction are taken from MOVE_TABLE. A transition is a neighbor if it
+        passes the reachability check of its kind:
+            - straight (forward/reverse): the destination is reachable
+            - half turn: the robot can half turn from the current position to the destination
+            - turn: the robot can turn from the current position to the destination
+        """
+        neighbors = []
+        grid = self.grid
+        danger = grid.danger_mask()
+
+        for (
+            dx,
+            dy,
+            new_direction,
+            motion,
+            extra_cost,
+            kind,
+            motion_cost,
+        ) in MOVE_TABLE[direction]:
+            new_x, new_y = x + dx, y + dy
+
+            if kind == STRAIGHT:
+                is_reachable = grid.reachable(new_x, new_y)
+            elif kind == HALF_TURN:
+                is_reachable = grid.half_turn_reachable(x, y, new_x, new_y)
+            else:
+                is_reachable = grid.turn_reachable(x, y, new_x, new_y, direction)
+
+            if is_reachable:
+                # get safe cost of destination (see _calculate_safe_cost)
+                safe_cost = (SAFE_COST if danger[new_x, new_y] else 0) + extra_cost
+                neighbors.append(
+                    (new_x, new_y, new_direction, safe_cost, motion, motion_cost)
                 )
 
-                # update the g distance if the new state has not been visited or the new cost is less than the previous cost
-                if (new_x, new_y, new_direction) not in g_dist or g_dist[
-                    (new_x, new_y, new_direction)
-                ] > dist + movement_cost:
-                    g_dist[(new_x, new_y, new_direction)] = (
-                        dist + movement_cost + screenshot_cost
+        return neighbors
+
+    def _get_predecessor_states(self, x, y, direction, sx, sy):
+        """
+        Return a list of tuples with format:
+        prevX, prevY, prev_direction, movement cost, motion
+
+        The states that can move to the given state, from PREDECESSOR_TABLE. A transition is kept if it passes the
+        same reachability check as in _get_neighboring_states, done from the previous state. Previous states outside
+        the grid are skipped, except for the start position (sx, sy).
+        """
+        predecessors = []
+        grid = self.grid
+
+        # get safe cost of destination
+        safe_cost = self._calculate_safe_cost(x, y)
+
+        for (
+            dx,
+            dy,
+            prev_direction,
+            motion,
+            extra_cost,
+            kind,
+            motion_cost,
+        ) in PREDECESSOR_TABLE[direction]:
+            prev_x, prev_y = x - dx, y - dy
+            if not grid.is_valid_coord(prev_x, prev_y) and (
+                prev_x != sx or prev_y != sy
+            ):
+                continue
+
+            if kind == STRAIGHT:
+                is_reachable = grid.reachable(x, y)
+            elif kind == HALF_TURN:
+                is_reachable = grid.half_turn_reachable(prev_x, prev_y, x, y)
+            else:
+                is_reachable = grid.turn_reachable(prev_x, prev_y, x, y, prev_direction)
+
+            if is_reachable:
+                predecessors.append(
+                    (
+                        prev_x,
+                        prev_y,
+                        prev_direction,
+                        motion_cost + safe_cost + extra_cost,
+                        motion,
                     )
+                )
 
-                    # add the new state to the heap
-                    heapq.heappush(heap, (total_cost, new_x, new_y, new_direction))
+        return predecessors
 
-                    # update the parent dict
-                    parent_dict[(new_x, new_y, new_direction)] = (x, y, direction)
+    def _store_motion(self, from_idx: int, to_idx: int, motion: Motion) -> None:
+        """
+        Store the motion between two states in the motion table, unless it is already stored
+        The motion table holds the motion values (motion ids), they are converted back to Motion in
+        optimal_path_to_motion_path. Both directions are stored, the reverse direction with the opposite motion
+        (10 - motion, see Motion), so that a single lookup is needed.
+        """
+        key = (from_idx << 20) | to_idx
+        if key not in self.motion_table:
+            self.motion_table[key] = int(motion)
+            self.motion_table[(to_idx << 20) | from_idx] = 10 - int(motion)
 
-    def _get_neighboring_states(
-        self, x, y, direction
-    ):  # TODO: see the behavior of the robot and adjust...
+    def _get_jump_neighbors(self, x, y, direction, end_cells):
         """
         Return a list of tuples with format:
-        newX, newY, new_direction
+        newX, newY, new_direction, movement cost, motion, number of cells moved
 
-        # Neighbors have the following format: {newX, newY, movement direction, safe cost, motion}
-        # Neighbors are coordinates that fulfill the following criteria:
-        # If moving in the same direction:
-        #   - Valid position within bounds
-        #   - Must be at least 4 units away in total (x+y)
-        #   - Furthest distance must be at least 3 units away (x or y)
-        # If it is exactly 2 units away in both x and y directions, safe cost = SAFECOST. Else, safe cost = 0
+        Same as _get_neighboring_states, except that the forward and reverse moves jump to the next jump point (see
+        _jump) instead of the adjacent cell. The movement cost includes the motion and safe costs of every cell moved.
+        end_cells is the set of (x, y) positions the search is looking for.
         """
         neighbors = []
 
-        # Assume that after following this direction, the car direction is EXACTLY md
-        for dx, dy, md in MOVE_DIRECTION:
-            if md == direction:  # if the new direction == md
-                # FORWARD
-                if self.grid.reachable(x + dx, y + dy):  # go forward;
-                    # Get safe cost of destination
-                    safe_cost = self._calculate_safe_cost(x + dx, y + dy)
-                    motion = Motion.FORWARD
-
-                    neighbors.append((x + dx, y + dy, md, safe_cost, motion))
-
-                # REVERSE
-                if self.grid.reachable(x - dx, y - dy):  # go back;
-                    # Get safe cost of destination
-                    safe_cost = self._calculate_safe_cost(x - dx, y - dy)
-                    motion = Motion.REVERSE
-                    neighbors.append((x - dx, y - dy, md, safe_cost, motion))
+        for (
+            new_x,
+            new_y,
+            new_direction,
+            safe_cost,
+            motion,
+            motion_cost,
+        ) in self._get_neighboring_states(x, y, direction):
+            if new_direction != direction:
+                # turns are always a single move
+                neighbors.append(
+                    (new_x, new_y, new_direction, motion_cost + safe_cost, motion, 1)
+                )
+                continue
+            if motion != Motion.FORWARD and motion != Motion.REVERSE:
+                # half turns are always a single move
+                neighbors.append(
+                    (new_x, new_y, new_direction, motion_cost + safe_cost, motion, 1)
+                )
+                continue
 
-                # half turns
-                delta_x, delta_y = self._get_half_turn_displacement(direction)
-                if direction == Direction.NORTH or direction == Direction.SOUTH:
-                    # FORWARD_OFFSET_RIGHT
-                    if self.grid.half_turn_reachable(x, y, x + delta_x, y + delta_y):
-                        safe_cost = self._calculate_safe_cost(x + delta_x, y + delta_y)
-                        motion = Motion.FORWARD_OFFSET_RIGHT
-                        neighbors.append(
-                            (x + delta_x, y + delta_y, md, safe_cost, motion)
-                        )
-
-                    # FORWARD_OFFSET_LEFT
-                    if self.grid.half_turn_reachable(x, y, x - delta_x, y + delta_y):
-
-                        safe_cost = self._calculate_safe_cost(x - delta_x, y + delta_y)
-                        motion = Motion.FORWARD_OFFSET_LEFT
-                        neighbors.append(
-                            (x - delta_x, y + delta_y, md, safe_cost, motion)
-                        )
-                    # REVERSE_OFFSET_RIGHT
-                    if self.grid.half_turn_reachable(x, y, x + delta_x, y - delta_y):
-
-                        safe_cost = self._calculate_safe_cost(x + delta_x, y - delta_y)
-                        motion = Motion.REVERSE_OFFSET_RIGHT
-                        neighbors.append(
-                            (x + delta_x, y - delta_y, md, safe_cost, motion)
-                        )
-                    # REVERSE_OFFSET_LEFT
-                    if self.grid.half_turn_reachable(x, y, x - delta_x, y - delta_y):
-
-                        safe_cost = self._calculate_safe_cost(x - delta_x, y - delta_y)
-                        motion = Motion.REVERSE_OFFSET_LEFT
-                        neighbors.append(
-                            (x - delta_x, y - delta_y, md, safe_cost, motion)
-                        )
-                else:
-                    # EAST or WEST
-                    # FORWARD_OFFSET_RIGHT
-                    if self.grid.half_turn_reachable(x, y, x + delta_x, y - delta_y):
-
-                        safe_cost = self._calculate_safe_cost(x + delta_x, y - delta_y)
-                        motion = Motion.FORWARD_OFFSET_RIGHT
-                        neighbors.append(
-                            (x + delta_x, y - delta_y, md, safe_cost, motion)
-                        )
-
-                    # FORWARD_OFFSET_LEFT
-                    if self.grid.half_turn_reachable(x, y, x + delta_x, y + delta_y):
-
-                        safe_cost = self._calculate_safe_cost(x + delta_x, y + delta_y)
-                        motion = Motion.FORWARD_OFFSET_LEFT
-                        neighbors.append(
-                            (x + delta_x, y + delta_y, md, safe_cost, motion)
-                        )
-
-                    # REVERSE_OFFSET_RIGHT
-                    if self.grid.half_turn_reachable(x, y, x - delta_x, y - delta_y):
-
-                        safe_cost = self._calculate_safe_cost(x - delta_x, y - delta_y)
-                        motion = Motion.REVERSE_OFFSET_RIGHT
-                        neighbors.append(
-                            (x - delta_x, y - delta_y, md, safe_cost, motion)
-                        )
-
-                    # REVERSE_OFFSET_LEFT
-                    if self.grid.half_turn_reachable(x, y, x - delta_x, y + delta_y):
-
-                        safe_cost = self._calculate_safe_cost(x - delta_x, y + delta_y)
-                        motion = Motion.REVERSE_OFFSET_LEFT
-                        neighbors.append(
-                            (x - delta_x, y + delta_y, md, safe_cost, motion)
-                        )
-
-            else:  # consider 8 cases
-
-                # Turning displacement is either 4-2 or 3-1
-                delta_big = TURNS[0]
-                delta_small = TURNS[1]
-
-                # north -> east
-                if direction == Direction.NORTH and md == Direction.EAST:
-                    # FORWARD_RIGHT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x + delta_big, y + delta_small, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x + delta_big, y + delta_small
-                        )
-                        motion = Motion.FORWARD_RIGHT_TURN
-                        neighbors.append(
-                            (x + delta_big, y + delta_small, md, safe_cost + 10, motion)
-                        )
-
-                    # REVERSE_LEFT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x - delta_small, y - delta_big, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x - delta_small, y - delta_big
-                        )
-                        motion = Motion.REVERSE_LEFT_TURN
-                        neighbors.append(
-                            (x - delta_small, y - delta_big, md, safe_cost + 10, motion)
-                        )
-
-                # east -> north
-                if direction == Direction.EAST and md == Direction.NORTH:
-                    # FORWARD_LEFT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x + delta_small, y + delta_big, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x + delta_small, y + delta_big
-                        )
-                        motion = Motion.FORWARD_LEFT_TURN
-                        neighbors.append(
-                            (x + delta_small, y + delta_big, md, safe_cost + 10, motion)
-                        )
-
-                    # REVERSE_RIGHT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x - delta_big, y - delta_small, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x - delta_big, y - delta_small
-                        )
-                        motion = Motion.REVERSE_RIGHT_TURN
-                        neighbors.append(
-                            (x - delta_big, y - delta_small, md, safe_cost + 10, motion)
-                        )
-
-                # east -> south
-                if direction == Direction.EAST and md == Direction.SOUTH:
-                    # FORWARD_RIGHT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x + delta_small, y - delta_big, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x + delta_small, y - delta_big
-                        )
-                        motion = Motion.FORWARD_RIGHT_TURN
-                        neighbors.append(
-                            (x + delta_small, y - delta_big, md, safe_cost + 10, motion)
-                        )
-
-                    # REVERSE_LEFT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x - delta_big, y + delta_small, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x - delta_big, y + delta_small
-                        )
-                        motion = Motion.REVERSE_LEFT_TURN
-                        neighbors.append(
-                            (x - delta_big, y + delta_small, md, safe_cost + 10, motion)
-                        )
-
-                # south -> east
-                if direction == Direction.SOUTH and md == Direction.EAST:
-                    # FORWARD_LEFT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x + delta_big, y - delta_small, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x + delta_big, y - delta_small
-                        )
-                        motion = Motion.FORWARD_LEFT_TURN
-                        neighbors.append(
-                            (x + delta_big, y - delta_small, md, safe_cost + 10, motion)
-                        )
-
-                    # REVERSE_RIGHT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x - delta_small, y + delta_big, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x - delta_small, y + delta_big
-                        )
-                        motion = Motion.REVERSE_RIGHT_TURN
-                        neighbors.append(
-                            (x - delta_small, y + delta_big, md, safe_cost + 10, motion)
-                        )
-
-                # south -> west
-                if direction == Direction.SOUTH and md == Direction.WEST:
-                    # FORWARD_RIGHT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x - delta_big, y - delta_small, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x - delta_big, y - delta_small
-                        )
-                        motion = Motion.FORWARD_RIGHT_TURN
-                        neighbors.append(
-                            (x - delta_big, y - delta_small, md, safe_cost + 10, motion)
-                        )
-
-                    # REVERSE_LEFT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x + delta_small, y + delta_big, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x + delta_small, y + delta_big
-                        )
-                        motion = Motion.REVERSE_LEFT_TURN
-                        neighbors.append(
-                            (x + delta_small, y + delta_big, md, safe_cost + 10, motion)
-                        )
-
-                # west -> south
-                if direction == Direction.WEST and md == Direction.SOUTH:
-                    # FORWARD_LEFT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x - delta_small, y - delta_big, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x - delta_small, y - delta_big
-                        )
-                        motion = Motion.FORWARD_LEFT_TURN
-                        neighbors.append(
-                            (x - delta_small, y - delta_big, md, safe_cost + 10, motion)
-                        )
-
-                    # REVERSE_RIGHT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x + delta_big, y + delta_small, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x + delta_big, y + delta_small
-                        )
-                        motion = Motion.REVERSE_RIGHT_TURN
-                        neighbors.append(
-                            (x + delta_big, y + delta_small, md, safe_cost + 10, motion)
-                        )
-
-                # west -> north
-                if direction == Direction.WEST and md == Direction.NORTH:
-                    # FORWARD_RIGHT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x - delta_small, y + delta_big, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x - delta_small, y + delta_big
-                        )
-                        motion = Motion.FORWARD_RIGHT_TURN
-                        neighbors.append(
-                            (x - delta_small, y + delta_big, md, safe_cost + 10, motion)
-                        )
-
-                    # REVERSE_LEFT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x + delta_big, y - delta_small, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x + delta_big, y - delta_small
-                        )
-                        motion = Motion.REVERSE_LEFT_TURN
-                        neighbors.append(
-                            (x + delta_big, y - delta_small, md, safe_cost + 10, motion)
-                        )
-
-                # north <-> west
-                if direction == Direction.NORTH and md == Direction.WEST:
-                    # FORWARD_LEFT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x - delta_big, y + delta_small, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x - delta_big, y + delta_small
-                        )
-                        motion = Motion.FORWARD_LEFT_TURN
-                        neighbors.append(
-                            (x - delta_big, y + delta_small, md, safe_cost + 10, motion)
-                        )
-
-                    # REVERSE_RIGHT_TURN
-                    if self.grid.turn_reachable(
-                        x, y, x + delta_small, y - delta_big, direction
-                    ):
-                        safe_cost = self._calculate_safe_cost(
-                            x + delta_small, y - delta_big
-                        )
-                        motion = Motion.REVERSE_RIGHT_TURN
-                        neighbors.append(
-                            (x + delta_small, y - delta_big, md, safe_cost + 10, motion)
-                        )
+            jump_point = self._jump(
+                new_x, new_y, direction, new_x - x, new_y - y, motion_cost, end_cells
+            )
+            if jump_point is not None:
+                jx, jy, steps, cost = jump_point
+                neighbors.append(
+                    (jx, jy, direction, motion_cost + safe_cost + cost, motion, steps)
+                )
 
         return neighbors
 
+    def _jump(self, x, y, direction, dx, dy, step_cost, end_cells):
+        """
+        Walk in a straight line from (x, y), which has already been checked to be reachable, until a jump point is
+        found. Return (jumpX, jumpY, number of cells moved, cost of the cells moved after (x, y)), or None if the
+        line is a dead end.
+
+        A cell is a jump point if it is in end_cells, or if the robot can half turn or turn from it. Every other
+        cell can only be left by continuing straight or going back, so the cells in between never need to be expanded.
+        """
+        steps = 1
+        cost = 0
+        while True:
+            if (x, y) in end_cells or self._has_turns(x, y, direction):
+                return x, y, steps, cost
+
+            x, y = x + dx, y + dy
+            if not self.grid.reachable(x, y):
+                # the robot can only go back the way it came
+                return None
+
+            steps += 1
+            cost += step_cost + self._calculate_safe_cost(x, y)
+
+    def _has_turns(self, x, y, direction) -> bool:
+        """
+        Check if the robot can half turn or turn from the given state
+        """
+        for dx, dy, _, _, _, kind, _ in MOVE_TABLE[direction]:
+            new_x, new_y = x + dx, y + dy
+            if kind == HALF_TURN:
+                if self.grid.half_turn_reachable(x, y, new_x, new_y):
+                    return True
+            elif kind == TURN:
+                if self.grid.turn_reachable(x, y, new_x, new_y, direction):
+                    return True
+        return False
+
     def _calculate_safe_cost(self, new_x: int, new_y: int) -> int:
         """
         calculates the safe cost of moving to a new position, considering obstacles that the robot might touch.
-        Currently, the function checks 2 units in each direction.
+        Currently, the function checks 2 units in each direction, which is precomputed in the danger mask of the grid
+        (see Grid.build_danger_cache).
         """
-        padding = 2
-        for obj in self.grid.obstacles:
-            if abs(obj.x - new_x) <= padding and abs(obj.y - new_y) <= padding:
-                return SAFE_COST
-            if abs(obj.y - new_y) <= padding and abs(obj.x - new_x) <= padding:
-                return SAFE_COST
-        return 0
+        return SAFE_COST if self.grid.danger_mask()[new_x, new_y] else 0
 
     def _record_path(self, start: CellState, end: CellState, parent: dict, cost: int):
         """
         Record the path between two states. Should be called only during the A* search.
+        The parent dict (or list) maps the state index of each state on the path to the state index of its parent.
         """
-        # update the cost table for edges (start, end) and (end, start)
-        self.cost_table[(start, end)] = cost
-        self.cost_table[(end, start)] = cost
-
-        # record the path
+        # record the path as state indices
         path = []
-        parent_pointer = (end.x, end.y, end.direction)
-        while parent_pointer in parent:
+        start_idx = self._sidx(start)
+        parent_pointer = self._sidx(end)
+        while parent_pointer != start_idx:
             path.append(parent_pointer)
             parent_pointer = parent[parent_pointer]
+
+            # expand straight jumps back into single cell moves
+            x, y, direction = self._decode_state(parent_pointer)
+            cx, cy, cd = self._decode_state(path[-1])
+            steps = abs(cx - x) + abs(cy - y)
+            if steps > 1 and cd == direction and (cx == x or cy == y):
+                # the state index changes by the same amount for every cell moved in a straight line
+                step = (path[-1] - parent_pointer) // steps
+                for i in range(steps - 1, 0, -1):
+                    path.append(parent_pointer + i * step)
         path.append(parent_pointer)
 
-        # reverse the path and store it in the path table
-        self.path_table[(start, end)] = path[::-1]
-        self.path_table[(end, start)] = path
+        self._store_path(start, end, path[::-1], cost)
 
-    @staticmethod
-    def _estimate_distance(
-        start: CellState,
-        end: CellState,
-        level=0,
-    ) -> int:
+    def _store_path(self, start: CellState, end: CellState, states, cost: int):
         """
-        Estimate the distance between two states.
-        level 0: Manhattan distance
-        level 1: Euclidean distance
+        Store a path from start to end, given as a sequence of state indices, and its cost
+        The path is stored as an int32 array of shape (n, 3) with a (x, y, direction value) row per state.
         """
-        horizontal_distance = start.x - end.x
-        vertical_distance = start.y - end.y
+        start_idx, end_idx = self._sidx(start), self._sidx(end)
+
+        # update the cost table for edges (start, end) and (end, start)
+        self.cost_table[(start_idx << 20) | end_idx] = cost
+        self.cost_table[(end_idx << 20) | start_idx] = cost
 
-        # Euclidean distance
-        if level == 1:
-            return math.sqrt(horizontal_distance**2 + vertical_distance**2)
+        # decode the state indices (see _state_index)
+        states = np.asarray(states, dtype=np.int32)
+        path = np.empty((len(states), 3), dtype=np.int32)
+        path[:, 0] = (states >> 2) // self.grid.size_y
+        path[:, 1] = (states >> 2) % self.grid.size_y
+        path[:, 2] = states & 3
 
-        # Manhattan distance
-        return abs(horizontal_distance) + abs(vertical_distance)
+        # store the path in the path table in both directions
+        self.path_table[(start_idx << 20) | end_idx] = path
+        self.path_table[(end_idx << 20) | start_idx] = path[::-1]
 
     @staticmethod
-    def _get_visit_options(n):
+    def _estimate_distance(x1: int, y1: int, x2: int, y2: int) -> int:
         """
-        Generate all possible visit options for n-digit binary numbers
+        Estimate the distance between two positions using the Manhattan distance.
         """
-        max_len = bin(2**n - 1).count("1")
-        strings = [bin(i)[2:].zfill(max_len) for i in range(2**n)]
-        strings.sort(key=lambda x: x.count("1"), reverse=True)
-        return strings
+        dx = x1 - x2
+        dy = y1 - y2
+        return (dx if dx >= 0 else -dx) + (dy if dy >= 0 else -dy)
 
     @staticmethod
-    def _generate_combinations(
-        view_positions,
-        index: int,
-        current,
-        result,
-        num_iters: int,
-    ):
-        """
-        Generate all possible combinations of the view positions
+    def _get_visit_options(n):
         """
-        # if all the view positions have been visited, add the current combination to the result
-        if index == len(view_positions):
-            result.append(current.copy())
-            return result
-
-        # if the number of iterations is 0, return the result
-        if num_iters == 0:
-            return result
-
-        # update the number of iterations
-        num_iters -= 1
+        Generate all possible visit options for n-digit binary numbers, most inclusive first.
 
-        # iterate over the view positions and generate the combinations for the next view position
-        for i in range(len(view_positions[index])):
-            current.append(i)
-            result = MazeSolver._generate_combinations(
-                view_positions, index + 1, current, result, num_iters
-            )
-            current.pop()
-
-        return result
+        Each option is an int bit mask, where the bit for position i (counting from 0) is 1 << (n - 1 - i), as in the
+        n-digit binary string of the mask. Options are yielded lazily in descending order of the number of 1s
+        (ascending numeric order among options with the same number of 1s), so that only the options that are tried
+        are ever built. The all-1s option is first, which is the only one needed when every obstacle can be visited.
+        """
+        full_mask = (1 << n) - 1
+        for num_zeros in range(n + 1):
+            # the lexicographic order of the zero positions is the ascending numeric order of the binary numbers
+            for zeros in combinations(range(n), num_zeros):
+                mask = full_mask
+                for i in zeros:
+                    mask ^= 1 << (n - 1 - i)
+                yield mask
 
     @staticmethod
     def _get_half_turn_displacement(direction: Direction):
-        # calculate delta small and delta big based on the direction
-        if direction == Direction.NORTH:
-            dx = HALF_TURNS[1]
-            dy = HALF_TURNS[0]
-
-        elif direction == Direction.SOUTH:
-            dx = -HALF_TURNS[1]
-            dy = -HALF_TURNS[0]
-
-        elif direction == Direction.EAST:
-            dx = HALF_TURNS[0]
-            dy = HALF_TURNS[1]
-        elif direction == Direction.WEST:
-            dx = -HALF_TURNS[0]
-            dy = -HALF_TURNS[1]
-        else:
+        """
+        Displacement (dx, dy) of a forward half turn, from HALF_TURN_DISPLACEMENT
+        """
+        try:
+            return HALF_TURN_DISPLACEMENT[direction]
+        except IndexError:
             raise ValueError(
                 f"Invalid direction {direction}. This should never happen."
             )
-        return dx, dy
 
     @staticmethod
     def _get_capture_relative_position(
@@ -780,72 +1483,95 @@ class MazeSolver:
         x, y, direction = cell_state.x, cell_state.y, cell_state.direction
         x_obs, y_obs = obstacle.x, obstacle.y
 
-        # check if the obstacle is in front of the robot
-        if direction == Direction.NORTH:
-            if x_obs == x and y_obs > y:
-                return "C"
-            elif x_obs < x:
-                return "L"
-            else:
-                return "R"
-        elif direction == Direction.SOUTH:
-            if x_obs == x and y_obs < y:
-                return "C"
-            elif x_obs < x:
-                return "R"
-            else:
-                return "L"
-        elif direction == Direction.EAST:
-            if y_obs == y and x_obs > x:
-                return "C"
-            elif y_obs < y:
-                return "R"
-            else:
-                return "L"
-        elif direction == Direction.WEST:
-            if y_obs == y and x_obs < x:
-                return "C"
-            elif y_obs < y:
-                return "L"
-            else:
-                return "R"
-        else:
+        # the position only depends on the direction and the signs of the offsets to the obstacle
+        sign_x = (x_obs > x) - (x_obs < x)
+        sign_y = (y_obs > y) - (y_obs < y)
+        try:
+            return CAPTURE_POSITION_TABLE[direction][sign_x + 1][sign_y + 1]
+        except IndexError:
             raise ValueError(
                 f"Invalid direction {direction}. This should never happen."
             )
 
+    def _path_state_indices(self, optimal_path: list) -> np.ndarray:
+        """
+        State indices (see _state_index) of the states of a path. The (x, y, direction) rows kept by get_optimal_path
+        are used if the path is the last optimal path, otherwise they are read from the cell states.
+        """
+        if optimal_path is self._optimal_path and len(optimal_path) == len(
+            self.optimal_path_xyd
+        ):
+            xyd = self.optimal_path_xyd.astype(np.int64)
+        else:
+            xyd = np.array(
+                [(state.x, state.y, int(state.direction)) for state in optimal_path],
+                dtype=np.int64,
+            ).reshape(-1, 3)
+        return (xyd[:, 0] * self.grid.size_y + xyd[:, 1]) * 4 + xyd[:, 2]
+
+    def iter_motion_path(self, optimal_path):
+        """
+        Yield the motions that the robot needs to take along the optimal path as (motion, obstacle id) pairs, without
+        building the lists of optimal_path_to_motion_path. The obstacle id is None for motions other than CAPTURE.
+        """
+        return self._iter_motion_path(
+            optimal_path, self._path_state_indices(optimal_path)
+        )
+
+    def _iter_motion_path(self, optimal_path, state_indices: np.ndarray):
+        """
+        iter_motion_path with the state indices of the path already calculated
+        """
+        motion_table = self.motion_table
+        capture = Motion.CAPTURE
+
+        # pack the (from, to) keys of all the edges at once
+        edge_keys = ((state_indices[:-1] << 20) | state_indices[1:]).tolist()
+        for i, edge_key in enumerate(edge_keys, 1):
+            try:
+                # both directions of every edge are stored in the motion table
+                motion_id = motion_table[edge_key]
+            except KeyError:
+                # if the motion is not found, then the path is invalid
+                raise ValueError(
+                    f"Invalid path from {optimal_path[i - 1]} to {optimal_path[i]}. This should never happen."
+                )
+            yield Motion(motion_id), None
+
+            # check if the robot is taking a screenshot
+            for obstacle_id in optimal_path[i].screenshot_id or ():
+                yield capture, obstacle_id
+
     def optimal_path_to_motion_path(self, optimal_path):
         """
         Convert the optimal path to a list of motions that the robot needs to take
         """
         # requires the path table to be filled and the optimal path to be calculated
+        # replanning often converts the same path again, so the result is cached for the current obstacles
+        state_indices = self._path_state_indices(optimal_path)
+        key = (
+            state_indices.tobytes(),
+            tuple(tuple(state.screenshot_id or ()) for state in optimal_path),
+        )
+        cached = self.motion_path_cache.get(key)
+        if cached is not None:
+            return list(cached[0]), list(cached[1])
+
         motion_path = []
         obstacle_id_list = []
-        for i in range(len(optimal_path) - 1):
-            from_state = optimal_path[i]
-            to_state = optimal_path[i + 1]
-            x, y, d = from_state.x, from_state.y, from_state.direction
-            x_new, y_new, d_new = to_state.x, to_state.y, to_state.direction
-
-            if (x_new, y_new, d_new, x, y, d) in self.motion_table:
-                # if the motion is not found, check the reverse motion and get its opposite
-                motion = self.motion_table[
-                    (x_new, y_new, d_new, x, y, d)
-                ].opposite_motion()
-            elif (x, y, d, x_new, y_new, d_new) in self.motion_table:
-                motion = self.motion_table[(x, y, d, x_new, y_new, d_new)]
-            else:
-                # if the motion is still not found, then the path is invalid
-                raise ValueError(
-                    f"Invalid path from {from_state} to {to_state}. This should never happen."
-                )
-
-            motion_path.append(motion)
+        motion_append = motion_path.append
+        obstacle_id_append = obstacle_id_list.append
+        for motion, obstacle_id in self._iter_motion_path(optimal_path, state_indices):
+            motion_append(motion)
+            if obstacle_id is not None:
+                obstacle_id_append(obstacle_id)
+
+        self.motion_path_cache[key] = (tuple(motion_path), tuple(obstacle_id_list))
+        return motion_path, obstacle_id_list
 
-            # check if the robot is taking a screenshot
-            if to_state.screenshot_id:
-                for idx in range(len(to_state.screenshot_id)):
-                    motion_path.append(Motion.CAPTURE)
-                    obstacle_id_list.append(to_state.screenshot_id[idx])
 
-        return motion_path, obstacle_id_list
+ROT_COST, REV_COST, HALF_COST = _build_cost_tables()
+CAPTURE_POSITION_TABLE = _build_capture_position_table()
+MOVE_TABLE = _build_move_table()
+PREDECESSOR_TABLE = _build_predecessor_table(MOVE_TABLE)
+NEIGHBOR_DELTAS = _build_neighbor_deltas(MOVE_TABLE)
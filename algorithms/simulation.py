@@ -1,16 +1,219 @@
 from algorithms.algo import MazeSolver
-from entities.entity import CellState, Obstacle
+from entities.entity import CellState
+from tools.jit import njit, NUMBA_AVAILABLE
 from tools.movement import Direction, Motion
 
 import os
 import json
 import random
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 import matplotlib
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from matplotlib.figure import Figure
+from PIL import Image
+
+from typing import Tuple, Literal
+
+# the frames are only rendered off screen, so no interactive backend is needed. Simplifying the paths of the artists
+# reduces the number of vertices Agg has to draw per frame
+matplotlib.use("Agg")
+matplotlib.rcParams["path.simplify"] = True
+matplotlib.rcParams["path.simplify_threshold"] = 1.0
+matplotlib.rcParams["agg.path.chunksize"] = 10000
+
+try:
+    # optional, faster parsing and writing of the debug obstacles file
+    import orjson
+except ImportError:
+    orjson = None
+
+# file the debug obstacles are saved to and file the path animations are saved to
+DEBUG_FILE = os.path.realpath(
+    os.path.join(os.path.dirname(__file__), "..", "debug", "obstacles.json")
+)
+ANIMATION_FILE = os.path.realpath(
+    os.path.join(os.path.dirname(__file__), "..", "animations", "optimal_path.gif")
+)
+
+# directions tried for random obstacles, in order (see MazeSolverSimulation._smart_direction_choice)
+SMART_DIRECTIONS = (Direction.NORTH, Direction.EAST, Direction.SOUTH, Direction.WEST)
+
+# markers of the obstacles and path states, and angles of the turn markers, in the order they are binned in
+MARKERS = ("^", ">", "v", "<")
+MARKERS_ANGLE = (45, 135, 225, 315)
+_MARKER_IDX = {marker: idx for idx, marker in enumerate(MARKERS)}
+_MARKER_ANGLE_IDX = {angle: idx for idx, angle in enumerate(MARKERS_ANGLE)}
+
+# marker of each direction
+_SYMBOL = {
+    Direction.NORTH: "^",
+    Direction.EAST: ">",
+    Direction.SOUTH: "v",
+    Direction.WEST: "<",
+}
+
+# angle of the turn marker for each (direction, new direction) of a turn, see MazeSolverSimulation._get_delta_angle
+_DELTA = {
+    (Direction.NORTH, Direction.EAST): 315,
+    (Direction.NORTH, Direction.WEST): 45,
+    (Direction.EAST, Direction.SOUTH): 225,
+    (Direction.EAST, Direction.NORTH): 315,
+    (Direction.SOUTH, Direction.WEST): 135,
+    (Direction.SOUTH, Direction.EAST): 225,
+    (Direction.WEST, Direction.NORTH): 45,
+    (Direction.WEST, Direction.SOUTH): 135,
+}
+
+
+@njit(cache=True)
+def _generate_obstacles_numba(banned, obstacles_xy, num_obstacles, candidates, picks):
+    """
+    Compiled version of the obstacle generation loop of MazeSolverSimulation.generate_random_obstacles, with the
+    checks of _smart_direction_choice (default paddings) inlined. banned[x, y] is True for the grid squares where
+    obstacles cannot be placed and is updated with the new obstacles.
+
+    The candidates (x, y) are tried in order, picks[k] picks the direction of candidate k among the available ones
+    (see _smart_direction_choice), so that the same candidates and picks give the same obstacles as the python loop.
+
+    :return: (n, 3) array of the x, y and index in SMART_DIRECTIONS of the direction of each obstacle, with at most
+        num_obstacles rows (fewer if the candidates run out)
+    """
+    grid_x, grid_y = banned.shape
+    approach_padding, mini_padding, unreachable_padding, area_padding = 5, 2, 6, 2
+
+    # positions of the obstacles, including the ones generated so far
+    num_existing = obstacles_xy.shape[0]
+    obs_x = np.empty(num_existing + num_obstacles, dtype=np.int64)
+    obs_y = np.empty(num_existing + num_obstacles, dtype=np.int64)
+    for k in range(num_existing):
+        obs_x[k] = obstacles_xy[k, 0]
+        obs_y[k] = obstacles_xy[k, 1]
+    count = num_existing
+
+    result = np.empty((num_obstacles, 3), dtype=np.int64)
+    available = np.empty(4, dtype=np.int64)
+    generated = 0
+    for c in range(candidates.shape[0]):
+        if generated == num_obstacles:
+            break
+        x = candidates[c, 0]
+        y = candidates[c, 1]
+        if banned[x, y]:
+            continue
+
+        # directions in SMART_DIRECTIONS order: NORTH, EAST, SOUTH, WEST
+        num_available = 0
+        for d in range(4):
+            blocked = False
+            for k in range(count):
+                ox, oy = obs_x[k], obs_y[k]
+                if d == 0:
+                    blocked = (
+                        x - mini_padding < ox < x + mini_padding
+                        and y < oy < y + approach_padding
+                    )
+                elif d == 1:
+                    blocked = (
+                        y - mini_padding < oy < y + mini_padding
+                        and x < ox < x + approach_padding
+                    )
+                elif d == 2:
+                    blocked = (
+                        x - mini_padding < ox < x + mini_padding
+                        and y - approach_padding < oy < y
+                    )
+                else:
+                    blocked = (
+                        y - mini_padding < oy < y + mini_padding
+                        and x - approach_padding < ox < x
+                    )
+                if blocked:
+                    break
+            if blocked:
+                continue
+
+            if d == 0 and y > grid_y - unreachable_padding:
+                continue
+            if d == 1 and x > grid_x - unreachable_padding:
+                continue
+            if d == 2 and y < unreachable_padding:
+                continue
+            if d == 3 and x < unreachable_padding:
+                continue
+
+            available[num_available] = d
+            num_available += 1
+
+        if num_available == 0:
+            continue
+
+        result[generated, 0] = x
+        result[generated, 1] = y
+        result[generated, 2] = available[int(picks[c] * num_available)]
+        generated += 1
+
+        # update the forbidden area with the new obstacle coordinates
+        for i in range(max(x - area_padding, 0), min(x + area_padding + 1, grid_x)):
+            for j in range(max(y - area_padding, 0), min(y + area_padding + 1, grid_y)):
+                banned[i, j] = True
+        obs_x[count] = x
+        obs_y[count] = y
+        count += 1
 
-from typing import List, Tuple, Literal
+    return result[:generated]
+
+
+# figure and animated artists of the animation frames, created once by each process that renders frames
+_frame_renderer = None
+
+
+def _init_frame_renderer(scene: dict) -> None:
+    """
+    Create the figure of the animation frames with the axes, the robot and the obstacles, which are the same in every
+    frame, and the screenshot, path and turn artists whose offsets are set per frame (see _render_frame)
+    """
+    global _frame_renderer
+
+    fig = Figure()
+    ax = fig.subplots()
+    limit = scene["limit"]
+    ax.set(xlim=(limit, 20), ylim=(limit, 20))
+    ax.set_xticks(range(0, 21))
+    ax.set_yticks(range(0, 21))
+    ax.grid()
+
+    robot_x, robot_y, robot_marker = scene["robot"]
+    ax.scatter(robot_x, robot_y, marker=robot_marker, color="red", s=100)
+
+    screenshot_artist = ax.scatter([], [], color="green", s=100, marker="*")
+    path_artists = []
+    turn_artists = []
+    for j, (marker, marker_angle) in enumerate(
+        zip(scene["markers"], scene["markers_angle"])
+    ):
+        obs_x, obs_y = scene["obstacles"][j]
+        if obs_x and obs_y:
+            ax.scatter(obs_x, obs_y, marker=marker, color="black", s=300)
+        path_artists.append(ax.scatter([], [], marker=marker, color="blue", s=80))
+        turn_artists.append(
+            ax.scatter([], [], marker=(3, 0, marker_angle), color="green", s=120)
+        )
+
+    _frame_renderer = (fig, [screenshot_artist] + path_artists + turn_artists)
+
+
+def _render_frame(offsets: list) -> Tuple[bytes, Tuple[int, int]]:
+    """
+    Render a frame from the offsets of each animated artist and return its RGBA pixels and size
+    """
+    fig, artists = _frame_renderer
+    for artist, artist_offsets in zip(artists, offsets):
+        artist.set_offsets(artist_offsets)
+
+    buf = BytesIO()
+    fig.savefig(buf, format="rgba", dpi=fig.dpi)
+    return buf.getvalue(), fig.canvas.get_width_height()
 
 
 class MazeSolverSimulation:
@@ -18,7 +221,7 @@ class MazeSolverSimulation:
     This class is used to run tests on the MazeSolver class.
     """
 
-    debug_file = os.path.join(os.path.dirname(__file__), "../debug", "obstacles.json")
+    debug_file = DEBUG_FILE
     debug = False
     debug_save = 0
 
@@ -46,6 +249,8 @@ class MazeSolverSimulation:
                 robot_direction=robot_direction,
             )
         )
+        # contents of the debug obstacles files keyed by path, read on first use (see _load_obstacles)
+        self._obstacles_cache = dict()
 
     def add_obstacles(self, obstacles):
         """
@@ -58,13 +263,10 @@ class MazeSolverSimulation:
 
         sim.add_obstacles([(0, 19, Direction.SOUTH, 1),(19, 19, Direction.WEST, 2)])
         """
-        for obstacle in obstacles:
-            self.maze_solver.add_obstacle(*obstacle)
+        self.maze_solver.add_obstacles(obstacles)
 
         if self.debug:
-            print(
-                f"Debug mode enabled. Storing obstacles to file {os.path.realpath(self.debug_file)}"
-            )
+            print(f"Debug mode enabled. Storing obstacles to file {self.debug_file}")
             # store the obstacles in a json file
             self._save_obstacles(obstacles, save_number=self.debug_save)
 
@@ -82,45 +284,82 @@ class MazeSolverSimulation:
         # get the existing obstacles to get obstacle ids
         obs_nums = [int(obstacle.get_obstacle_id()) for obstacle in existing_obstacles]
         max_obs_num = max(obs_nums) if obs_nums else 0
-
-        banned_gridsq = self._get_forbidden_area(
-            [(robot_state.x, robot_state.y)], padding=padding
+        # positions of the obstacles, including the ones generated so far
+        obstacles_xy = np.array(
+            [(obstacle.x, obstacle.y) for obstacle in existing_obstacles],
+            dtype=np.int32,
+        ).reshape(-1, 2)
+
+        # grid squares where obstacles cannot be placed, banned[x * grid_y + y] is 1 if (x, y) is forbidden
+        banned = bytearray(grid_x * grid_y)
+        self._mark_forbidden_area(
+            banned, [(robot_state.x, robot_state.y)], grid_x, grid_y, padding=padding
         )
 
+        # candidates are drawn in batches of (x, y) coordinates and a number in [0, 1) that picks the direction among
+        # the available ones. Both versions draw from the same generator, seeded from random, so that random.seed
+        # gives the same obstacles whether numba is installed or not
+        rng = np.random.default_rng(random.getrandbits(32))
+        batch_size = max(8 * num_obstacles, 64)
+        # the compiled version marks the forbidden area through a view of the bitboard
+        banned_grid = np.frombuffer(banned, dtype=np.bool_).reshape(grid_x, grid_y)
+
         obstacles = []
-        for i in range(num_obstacles):
+        while len(obstacles) < num_obstacles:
             # generate obstacles with random x and y coordinates
-            obs_x = random.randint(0 + padding, grid_x - 1 - padding)
-            obs_y = random.randint(0 + padding, grid_y - 1 - padding)
-
-            direction = None
-            # check if the obstacle is in the forbidden area
-            while (obs_x, obs_y) in banned_gridsq or direction is None:
-                # while the obstacle is in the forbidden area, generate new coordinates
-                obs_x = random.randint(0 + padding, grid_x - 1 - padding)
-                obs_y = random.randint(0 + padding, grid_y - 1 - padding)
-                if (obs_x, obs_y) in banned_gridsq:
+            candidates = rng.integers(
+                padding, (grid_x - padding, grid_y - padding), size=(batch_size, 2)
+            )
+            picks = rng.random(batch_size)
+
+            if NUMBA_AVAILABLE:
+                generated = _generate_obstacles_numba(
+                    banned_grid,
+                    obstacles_xy,
+                    num_obstacles - len(obstacles),
+                    candidates,
+                    picks,
+                )
+                for obs_x, obs_y, direction_idx in generated.tolist():
+                    # get the obstacle id
+                    obs_id = max_obs_num + len(obstacles) + 1
+                    obstacles.append(
+                        (obs_x, obs_y, SMART_DIRECTIONS[direction_idx], obs_id)
+                    )
+                obstacles_xy = np.vstack(
+                    (obstacles_xy, generated[:, :2].astype(np.int32))
+                )
+                continue
+
+            for (obs_x, obs_y), pick in zip(candidates.tolist(), picks.tolist()):
+                if len(obstacles) == num_obstacles:
+                    break
+
+                # check if the obstacle is in the forbidden area
+                if banned[obs_x * grid_y + obs_y]:
                     continue
 
                 # choose a random direction for the obstacle smartly
                 direction = self._smart_direction_choice(
-                    obs_x, obs_y, existing_obstacles
+                    obs_x, obs_y, obstacles_xy, pick
                 )
+                if direction is None:
+                    continue
+
+                # update the forbidden area with the new obstacle coordinates
+                self._mark_forbidden_area(banned, [(obs_x, obs_y)], grid_x, grid_y)
 
-            # update the forbidden area with the new obstacle coordinates
-            banned_gridsq.update(self._get_forbidden_area([(obs_x, obs_y)]))
+                # get the obstacle id
+                obs_id = max_obs_num + len(obstacles) + 1
 
-            # get the obstacle id
-            obs_id = max_obs_num + i + 1
+                obstacles.append((obs_x, obs_y, direction, obs_id))
+                obstacles_xy = np.vstack((obstacles_xy, [(obs_x, obs_y)]))
 
-            # add the obstacle to the grid
-            obstacles.append((obs_x, obs_y, direction, obs_id))
-            self.maze_solver.add_obstacle(obs_x, obs_y, direction, obs_id)
+        # add the obstacles to the grid
+        self.maze_solver.add_obstacles(obstacles)
 
         if self.debug:
-            print(
-                f"Debug mode enabled. Storing obstacles to file {os.path.realpath(self.debug_file)}"
-            )
+            print(f"Debug mode enabled. Storing obstacles to file {self.debug_file}")
             # store the obstacles in a json file
             self._save_obstacles(obstacles, save_number=self.debug_save)
 
@@ -143,15 +382,9 @@ class MazeSolverSimulation:
             # logging.error(f"Invalid load option {load_option}. It must be between 0 and 3.")
             return
 
-        for obs in obstacles:
-            obs_x, obs_y, direction, obs_id = (
-                obs["x"],
-                obs["y"],
-                obs["direction"],
-                obs["id"],
-            )
-            self.maze_solver.add_obstacle(obs_x, obs_y, direction, obs_id)
-            # logging.info(f"Added obstacle at ({obs_x}, {obs_y}) with direction {direction} and id {obs_id}")
+        self.maze_solver.add_obstacles(
+            [(obs["x"], obs["y"], obs["direction"], obs["id"]) for obs in obstacles]
+        )
         return obstacles
 
     def reset_obstacles(self):
@@ -166,7 +399,7 @@ class MazeSolverSimulation:
 
         """
         print("Calculating optimal path...")
-        return self.maze_solver.get_optimal_path(False)
+        return self.maze_solver.get_optimal_path()
 
     def plot_optimal_path_animation(self, verbose=False):
         """
@@ -175,11 +408,8 @@ class MazeSolverSimulation:
 
         If verbose is set to True, the optimal path is printed to the console.
         """
-        num_points = 3
-        robot_state = self.maze_solver.robot.get_start_state()
-        obstacles = self.maze_solver.grid.obstacles
         print("Calculating optimal path...")
-        optimal_path, cost = self.maze_solver.get_optimal_path(False)
+        optimal_path, cost = self.maze_solver.get_optimal_path()
 
         if verbose:
             print(f"Optimal path with cost = {cost} calculated: ")
@@ -193,299 +423,15 @@ class MazeSolverSimulation:
                     )
 
         print("Plotting optimal path animation")
-        fig, ax = plt.subplots()
-
-        # get data
-        obs_x = [[], [], [], []]
-        obs_y = [[], [], [], []]
-        markers = ["^", ">", "v", "<"]
-
-        for cell in obstacles:
-            idx = markers.index(self._get_direction_symbol(cell.direction))
-
-            obs_x[idx].append(cell.x)
-            obs_y[idx].append(cell.y)
-
-        path_x = [[], [], [], []]
-        path_y = [[], [], [], []]
-
-        screenshot_x, screenshot_y = [], []
-
-        angle_x = [[], [], [], []]
-        angle_y = [[], [], [], []]
-        markers_angle = [45, 135, 225, 315]
-        prev_cell = robot_state
-        time = 0
-        for cell in optimal_path:
-            # creating intermediate points for turns
-            if abs(prev_cell.x - cell.x) > 1 or abs(prev_cell.y - cell.y) > 1:
-                angle = self._get_delta_angle(prev_cell.direction, cell.direction)
-                if angle is None:
-                    raise ValueError(
-                        f"Invalid turn from {prev_cell.direction} to {cell.direction}. "
-                        f"The location of the robot is {prev_cell.x}, {prev_cell.y}"
-                        f" and the location of the next cell is {cell.x}, {cell.y}"
-                    )
-                elif angle == 0:
-                    # half turn
-                    angle = self._get_half_turn_angles(
-                        prev_cell.x, prev_cell.y, cell.x, cell.y, prev_cell.direction
-                    )
-
-                angle_idx = markers_angle.index(angle)
-                x_diff = cell.x - prev_cell.x
-                y_diff = cell.y - prev_cell.y
-                for i in range(1, 1 + num_points):
-                    angle_x[angle_idx].append(
-                        (prev_cell.x + i * x_diff / (1 + num_points), time)
-                    )
-                    angle_y[angle_idx].append(
-                        (prev_cell.y + i * y_diff / (1 + num_points), time)
-                    )
-                    time += 1
-
-            if cell.screenshot_id:
-                screenshot_x.append((cell.x, time))
-                screenshot_y.append((cell.y, time))
-
-            idx = markers.index(self._get_direction_symbol(cell.direction))
-            path_x[idx].append((cell.x, time))
-            path_y[idx].append((cell.y, time))
-            prev_cell = cell
-            time += 1
-
-        ax.set(xlim=(0, 20), ylim=(0, 20))
-        ax.set_xticks(range(0, 21))
-        ax.set_yticks(range(0, 21))
-
-        def update(frame_num):
-            ax.clear()
-            ax.set(xlim=(0, 20), ylim=(0, 20))
-            ax.set_xticks(range(0, 21))
-            ax.set_yticks(range(0, 21))
-            ax.grid()
-
-            # robot
-            ax.scatter(
-                robot_state.x,
-                robot_state.y,
-                marker=self._get_direction_symbol(robot_state.direction),
-                color="red",
-                s=100,
-            )
-
-            data_x = [[], [], [], []]
-            data_y = [[], [], [], []]
-            data_x_turn = [[], [], [], []]
-            data_y_turn = [[], [], [], []]
-
-            for index in range(4):
-                dir_x = path_x[index]
-                dir_y = path_y[index]
-                dir_x_turn = angle_x[index]
-                dir_y_turn = angle_y[index]
-                for num in range(len(dir_x)):
-                    pos_x, t = dir_x[num]
-                    pos_y, _ = dir_y[num]
-                    if frame_num - 2 <= t <= frame_num:
-                        data_x[index].append(pos_x)
-                        data_y[index].append(pos_y)
-
-                for num in range(len(dir_x_turn)):
-                    posangle_x, t = dir_x_turn[num]
-                    posangle_y, _ = dir_y_turn[num]
-                    if frame_num - 2 <= t <= frame_num:
-                        data_x_turn[index].append(posangle_x)
-                        data_y_turn[index].append(posangle_y)
-
-            x_image = [x_pos for x_pos, t in screenshot_x if frame_num > t]
-            y_image = [y_pos for y_pos, t in screenshot_y if frame_num > t]
-
-            if screenshot_x and screenshot_y:
-                ax.scatter(x_image, y_image, color="green", s=100, marker="*")
-
-            for j in range(len(markers)):
-                if obs_x[j] and obs_y[j]:
-                    ax.scatter(
-                        obs_x[j], obs_y[j], marker=markers[j], color="black", s=300
-                    )
-
-                if data_x[j] and data_y[j]:
-                    ax.scatter(
-                        data_x[j], data_y[j], marker=markers[j], color="blue", s=80
-                    )
-
-                if data_x_turn[j] and data_y_turn[j]:
-                    ax.scatter(
-                        data_x_turn[j],
-                        data_y_turn[j],
-                        marker=(3, 0, markers_angle[j]),
-                        color="green",
-                        s=120,
-                    )
-
-        if verbose:
-            print("Animating optimal path...")
-
-        ani = animation.FuncAnimation(fig, update, frames=time + 5, interval=300)
-        out_path = os.path.realpath(
-            os.path.join(os.path.dirname(__file__), "../animations", "optimal_path.gif")
-        )
-
-        print(f"Saving animation to {out_path}")
-
-        ani.save(out_path, writer="pillow")
+        self._build_animation(optimal_path, limit=0, verbose=verbose)
         return optimal_path, cost
 
     def plot_animation_from_path(self, optimal_path, verbose=False):
         """
         Plots an animation of the robot traversing the grid based on the optimal path.
         """
-        num_points = 3
-        robot_state = self.maze_solver.robot.get_start_state()
-        obstacles = self.maze_solver.grid.obstacles
         print("Plotting optimal path animation")
-        fig, ax = plt.subplots()
-        # get data
-        obs_x = [[], [], [], []]
-        obs_y = [[], [], [], []]
-        markers = ["^", ">", "v", "<"]
-
-        for cell in obstacles:
-            idx = markers.index(self._get_direction_symbol(cell.direction))
-
-            obs_x[idx].append(cell.x)
-            obs_y[idx].append(cell.y)
-
-        path_x = [[], [], [], []]
-        path_y = [[], [], [], []]
-
-        screenshot_x, screenshot_y = [], []
-
-        angle_x = [[], [], [], []]
-        angle_y = [[], [], [], []]
-        markers_angle = [45, 135, 225, 315]
-        prev_cell = robot_state
-        time = 0
-        for cell in optimal_path:
-            # creating intermediate points for turns
-            if abs(prev_cell.x - cell.x) > 1 or abs(prev_cell.y - cell.y) > 1:
-                angle = self._get_delta_angle(prev_cell.direction, cell.direction)
-                if angle is None:
-                    raise ValueError(
-                        f"Invalid turn from {prev_cell.direction} to {cell.direction}. "
-                        f"The location of the robot is {prev_cell.x}, {prev_cell.y}"
-                        f" and the location of the next cell is {cell.x}, {cell.y}"
-                    )
-                elif angle == 0:
-                    # half turn
-                    angle = self._get_half_turn_angles(
-                        prev_cell.x, prev_cell.y, cell.x, cell.y, prev_cell.direction
-                    )
-
-                angle_idx = markers_angle.index(angle)
-                x_diff = cell.x - prev_cell.x
-                y_diff = cell.y - prev_cell.y
-                for i in range(1, 1 + num_points):
-                    angle_x[angle_idx].append(
-                        (prev_cell.x + i * x_diff / (1 + num_points), time)
-                    )
-                    angle_y[angle_idx].append(
-                        (prev_cell.y + i * y_diff / (1 + num_points), time)
-                    )
-                    time += 1
-
-            if cell.screenshot_id:
-                screenshot_x.append((cell.x, time))
-                screenshot_y.append((cell.y, time))
-
-            idx = markers.index(self._get_direction_symbol(cell.direction))
-            path_x[idx].append((cell.x, time))
-            path_y[idx].append((cell.y, time))
-            prev_cell = cell
-            time += 1
-
-        ax.set(xlim=(0, 20), ylim=(0, 20))
-        ax.set_xticks(range(0, 21))
-        ax.set_yticks(range(0, 21))
-
-        def update(frame_num):
-            ax.clear()
-            ax.set(xlim=(-1, 20), ylim=(-1, 20))
-            ax.set_xticks(range(0, 21))
-            ax.set_yticks(range(0, 21))
-            ax.grid()
-
-            # robot
-            ax.scatter(
-                robot_state.x,
-                robot_state.y,
-                marker=self._get_direction_symbol(robot_state.direction),
-                color="red",
-                s=100,
-            )
-
-            data_x = [[], [], [], []]
-            data_y = [[], [], [], []]
-            data_x_turn = [[], [], [], []]
-            data_y_turn = [[], [], [], []]
-
-            for index in range(4):
-                dir_x = path_x[index]
-                dir_y = path_y[index]
-                dir_x_turn = angle_x[index]
-                dir_y_turn = angle_y[index]
-                for num in range(len(dir_x)):
-                    pos_x, t = dir_x[num]
-                    pos_y, _ = dir_y[num]
-                    if frame_num - 2 <= t <= frame_num:
-                        data_x[index].append(pos_x)
-                        data_y[index].append(pos_y)
-
-                for num in range(len(dir_x_turn)):
-                    posangle_x, t = dir_x_turn[num]
-                    posangle_y, _ = dir_y_turn[num]
-                    if frame_num - 2 <= t <= frame_num:
-                        data_x_turn[index].append(posangle_x)
-                        data_y_turn[index].append(posangle_y)
-
-            x_image = [x_pos for x_pos, t in screenshot_x if frame_num > t]
-            y_image = [y_pos for y_pos, t in screenshot_y if frame_num > t]
-
-            if screenshot_x and screenshot_y:
-                ax.scatter(x_image, y_image, color="green", s=100, marker="*")
-
-            for j in range(len(markers)):
-                if obs_x[j] and obs_y[j]:
-                    ax.scatter(
-                        obs_x[j], obs_y[j], marker=markers[j], color="black", s=300
-                    )
-
-                if data_x[j] and data_y[j]:
-                    ax.scatter(
-                        data_x[j], data_y[j], marker=markers[j], color="blue", s=80
-                    )
-
-                if data_x_turn[j] and data_y_turn[j]:
-                    ax.scatter(
-                        data_x_turn[j],
-                        data_y_turn[j],
-                        marker=(3, 0, markers_angle[j]),
-                        color="green",
-                        s=120,
-                    )
-
-        if verbose:
-            print("Animating optimal path...")
-
-        ani = animation.FuncAnimation(fig, update, frames=time + 5, interval=300)
-        out_path = os.path.realpath(
-            os.path.join(os.path.dirname(__file__), "../animations", "optimal_path.gif")
-        )
-
-        print(f"Saving animation to {out_path}")
-
-        ani.save(out_path, writer="pillow")
+        self._build_animation(optimal_path, limit=-1, verbose=verbose)
 
     def enable_debug(self, save_number=0):
         """
@@ -498,9 +444,12 @@ class MazeSolverSimulation:
         if save_number is between 1 and 3, the obstacles are saved to the corresponding save slot AND to the "last" slot.
         """
         self.debug_save = save_number
+        if self.debug:
+            # the debug file has already been created
+            return
+
         self.debug = True
-        if not os.path.exists(os.path.dirname(self.debug_file)):
-            os.makedirs(os.path.dirname(self.debug_file))
+        os.makedirs(os.path.dirname(self.debug_file), exist_ok=True)
         if not os.path.exists(self.debug_file):
             with open(self.debug_file, "w") as f:
                 json.dump({"save_1": [], "save_2": [], "save_3": [], "last": []}, f)
@@ -530,49 +479,236 @@ class MazeSolverSimulation:
         old_obs["last"] = serialized_obstacles
 
         try:
-            with open(self.debug_file, "w") as f:
-                json.dump(old_obs, f, indent=4)
+            if orjson is not None:
+                with open(self.debug_file, "wb") as f:
+                    f.write(orjson.dumps(old_obs, option=orjson.OPT_INDENT_2))
+            else:
+                with open(self.debug_file, "w") as f:
+                    json.dump(old_obs, f, indent=4)
+            # only cache what has been written, so that the cache stays the same as the file
+            self._obstacles_cache[self.debug_file] = old_obs
         except IOError as e:
             # logging.error(f"Unable to save obstacles to file: {e}")
-            pass
+            # the file may have been partly written, it is read again on the next load
+            self._obstacles_cache.pop(self.debug_file, None)
 
     def _load_obstacles(self, option="last") -> dict:
-        try:
-            with open(self.debug_file, "r") as f:
-                serialized_obstacles = json.load(f)
-        except IOError as e:
-            # logging.info(f"Unable to load obstacles from file: {e}")
-            return {"save_1": [], "save_2": [], "save_3": [], "last": []}
+        # the file is only written by _save_obstacles, which keeps the cache up to date
+        # the cache is keyed by the path, so that a different debug_file is read from its own file
+        serialized_obstacles = self._obstacles_cache.get(self.debug_file)
+        if serialized_obstacles is None:
+            try:
+                if orjson is not None:
+                    with open(self.debug_file, "rb") as f:
+                        serialized_obstacles = orjson.loads(f.read())
+                else:
+                    with open(self.debug_file, "r") as f:
+                        serialized_obstacles = json.load(f)
+            except IOError as e:
+                # logging.info(f"Unable to load obstacles from file: {e}")
+                return {"save_1": [], "save_2": [], "save_3": [], "last": []}
+            self._obstacles_cache[self.debug_file] = serialized_obstacles
 
         if option == "all":
-            return serialized_obstacles
+            # a copy, since _save_obstacles changes it before writing it to the file
+            return dict(serialized_obstacles)
         else:
             return {f"{option}": serialized_obstacles[option]}
 
+    def _build_animation(self, optimal_path, limit: int, verbose=False):
+        """
+        Bin the obstacles and the states of the optimal path by marker, with intermediate points for turns, and save
+        the animation of the path (see _save_animation). limit is the lower limit of both axes.
+        """
+        num_points = 3
+        robot_state = self.maze_solver.robot.get_start_state()
+        obstacles = self.maze_solver.grid.obstacles
+        markers = MARKERS
+
+        # positions and marker indices of the obstacles and of the path states, as arrays
+        obs_xy = np.array([(cell.x, cell.y) for cell in obstacles]).reshape(-1, 2)
+        obs_idx = np.array(
+            [
+                _MARKER_IDX[self._get_direction_symbol(cell.direction)]
+                for cell in obstacles
+            ],
+            dtype=np.int64,
+        )
+        path_xy = np.array([(cell.x, cell.y) for cell in optimal_path]).reshape(-1, 2)
+        path_idx = np.array(
+            [
+                _MARKER_IDX[self._get_direction_symbol(cell.direction)]
+                for cell in optimal_path
+            ],
+            dtype=np.int64,
+        )
+        screenshot_mask = np.array(
+            [bool(cell.screenshot_id) for cell in optimal_path], dtype=np.bool_
+        )
+
+        # states more than one grid square from the previous state are turns, shown by num_points intermediate points
+        # in the frames before the state
+        prev_xy = np.vstack(([(robot_state.x, robot_state.y)], path_xy))[:-1]
+        is_turn = (np.abs(path_xy - prev_xy) > 1).any(axis=1)
+        path_time = np.arange(len(path_xy)) + num_points * np.cumsum(is_turn)
+
+        turn_points = [[], [], [], []]
+        turn_times = [[], [], [], []]
+        for i in np.flatnonzero(is_turn).tolist():
+            prev_cell = optimal_path[i - 1] if i > 0 else robot_state
+            cell = optimal_path[i]
+            angle = self._get_delta_angle(prev_cell.direction, cell.direction)
+            if angle is None:
+                raise ValueError(
+                    f"Invalid turn from {prev_cell.direction} to {cell.direction}. "
+                    f"The location of the robot is {prev_cell.x}, {prev_cell.y}"
+                    f" and the location of the next cell is {cell.x}, {cell.y}"
+                )
+            elif angle == 0:
+                # half turn
+                angle = self._get_half_turn_angles(
+                    prev_cell.x, prev_cell.y, cell.x, cell.y, prev_cell.direction
+                )
+
+            angle_idx = _MARKER_ANGLE_IDX[angle]
+            steps = np.arange(1, 1 + num_points)[:, None]
+            turn_points[angle_idx].append(
+                prev_xy[i] + steps * (path_xy[i] - prev_xy[i]) / (1 + num_points)
+            )
+            turn_times[angle_idx].append(path_time[i] - num_points - 1 + steps[:, 0])
+
+        self._save_animation(
+            [obs_xy[obs_idx == j].T.tolist() for j in range(len(markers))],
+            [path_xy[path_idx == j].astype(float) for j in range(len(markers))],
+            [path_time[path_idx == j] for j in range(len(markers))],
+            [
+                np.concatenate(points) if points else np.zeros((0, 2))
+                for points in turn_points
+            ],
+            [
+                np.concatenate(times) if times else np.zeros(0, dtype=np.int64)
+                for times in turn_times
+            ],
+            path_xy[screenshot_mask].astype(float),
+            path_time[screenshot_mask],
+            num_frames=len(path_xy) + num_points * int(is_turn.sum()) + 5,
+            limit=limit,
+            verbose=verbose,
+        )
+
+    def _save_animation(
+        self,
+        obstacles_xy: list,
+        path_xy: list,
+        path_t: list,
+        turn_xy: list,
+        turn_t: list,
+        screenshot_xy: np.ndarray,
+        screenshot_t: np.ndarray,
+        num_frames: int,
+        limit: int,
+        verbose=False,
+    ):
+        """
+        Render the frames of the path animation and save them as a gif to animations/optimal_path.gif.
+        The frames are rendered in parallel by worker processes if there is more than one cpu.
+
+        For each marker, obstacles_xy has the [xs, ys] of the obstacles, path_xy and turn_xy have (n, 2) arrays of
+        the positions of the path and turn points, and path_t and turn_t have their times. The points of each marker,
+        and the screenshots, are in time order.
+        """
+        robot_state = self.maze_solver.robot.get_start_state()
+        markers = MARKERS
+        scene = {
+            "limit": limit,
+            "robot": (
+                robot_state.x,
+                robot_state.y,
+                self._get_direction_symbol(robot_state.direction),
+            ),
+            "markers": MARKERS,
+            "markers_angle": MARKERS_ANGLE,
+            "obstacles": obstacles_xy,
+        }
+
+        # offsets of the screenshot, path and turn artists in each frame, the points visible in a frame are a slice
+        # of the points in time order
+        frames = []
+        for frame_num in range(num_frames):
+            # screenshots stay visible once they are taken
+            offsets = [screenshot_xy[: np.searchsorted(screenshot_t, frame_num)]]
+
+            # path and turn points are visible for the 3 frames up to and including their time
+            for points, times in [(path_xy, path_t), (turn_xy, turn_t)]:
+                for j in range(len(markers)):
+                    start = np.searchsorted(times[j], frame_num - 2)
+                    end = np.searchsorted(times[j], frame_num, side="right")
+                    offsets.append(points[j][start:end])
+            frames.append(offsets)
+
+        if verbose:
+            print("Animating optimal path...")
+
+        workers = min(os.cpu_count() or 1, num_frames)
+        # the workers use the default start method of the platform. Where it is spawn or forkserver, the workers
+        # import the main script, so scripts that plot animations need an if __name__ == "__main__": guard
+        if workers > 1:
+            with ProcessPoolExecutor(
+                workers,
+                initializer=_init_frame_renderer,
+                initargs=(scene,),
+            ) as executor:
+                rendered = list(
+                    executor.map(
+                        _render_frame,
+                        frames,
+                        chunksize=max(1, num_frames // (4 * workers)),
+                    )
+                )
+        else:
+            _init_frame_renderer(scene)
+            rendered = [_render_frame(offsets) for offsets in frames]
+
+        images = []
+        for pixels, size in rendered:
+            image = Image.frombuffer("RGBA", size, pixels, "raw", "RGBA", 0, 1)
+            # opaque frames are converted to RGB, which gives a better gif palette
+            if image.getextrema()[3][0] == 255:
+                image = image.convert("RGB")
+            images.append(image)
+
+        print(f"Saving animation to {ANIMATION_FILE}")
+
+        # 300 ms per frame
+        images[0].save(
+            ANIMATION_FILE,
+            save_all=True,
+            append_images=images[1:],
+            duration=300,
+            loop=0,
+        )
+
     @staticmethod
-    def _get_forbidden_area(obstacle_positions, padding=2) -> set:
+    def _mark_forbidden_area(
+        banned: bytearray, obstacle_positions, grid_x: int, grid_y: int, padding=2
+    ) -> None:
         """
-        function to get the grid squares where objects cannot be placed since there are already obstacles there.
+        Mark the grid squares where objects cannot be placed since there are already obstacles there, i.e. the grid
+        squares within padding of the obstacle positions, in the banned bitboard, where banned[x * grid_y + y] is 1
+        if (x, y) is forbidden.
         """
-        forbidden_area = set()
-        for obstacle_pos in obstacle_positions:
-            x, y = obstacle_pos
-            # add padding around the obstacle
-            for i in range(-padding, padding + 1):
-                for j in range(-padding, padding + 1):
-                    forbidden_area.add((x + i, y + j))
-        return forbidden_area
+        for x, y in obstacle_positions:
+            # each column of the padding square is a contiguous run of the bitboard
+            y_start, y_end = max(y - padding, 0), min(y + padding + 1, grid_y)
+            if y_start >= y_end:
+                continue
+            run = b"\x01" * (y_end - y_start)
+            for i in range(max(x - padding, 0), min(x + padding + 1, grid_x)):
+                banned[i * grid_y + y_start : i * grid_y + y_end] = run
 
     @staticmethod
     def _get_direction_symbol(direction):
-        if direction == Direction.NORTH:
-            return "^"
-        elif direction == Direction.EAST:
-            return ">"
-        elif direction == Direction.SOUTH:
-            return "v"
-        elif direction == Direction.WEST:
-            return "<"
+        return _SYMBOL.get(direction)
 
     @staticmethod
     def _get_delta_angle(direction1, direction2):
@@ -590,75 +726,53 @@ class MazeSolverSimulation:
             # for half turns, no delta angle
             return 0
 
-        if direction1 == Direction.NORTH:
-            if direction2 == Direction.EAST:
-                return 315
-            elif direction2 == Direction.WEST:
-                return 45
-
-        elif direction1 == Direction.EAST:
-            if direction2 == Direction.SOUTH:
-                return 225
-            elif direction2 == Direction.NORTH:
-                return 315
-
-        elif direction1 == Direction.SOUTH:
-            if direction2 == Direction.WEST:
-                return 135
-            elif direction2 == Direction.EAST:
-                return 225
-
-        elif direction1 == Direction.WEST:
-            if direction2 == Direction.NORTH:
-                return 45
-            elif direction2 == Direction.SOUTH:
-                return 135
-
-        return None
+        return _DELTA.get((direction1, direction2))
 
     @staticmethod
     def _is_approach_blocked(
         x: int,
         y: int,
         direction: Direction,
-        obstacles: List[Obstacle],
+        obstacles_xy: np.ndarray,
         padding: int = 5,
     ) -> bool:
         """
-        Check if the direction is valid based on the location of the obstacles.
+        Check if the direction is valid based on the location of the obstacles, given as an (n, 2) array of their
+        (x, y) positions.
         """
         mini_padding = padding // 2
+        obs_x, obs_y = obstacles_xy[:, 0], obstacles_xy[:, 1]
         if direction == Direction.NORTH:
-            for obstacle in obstacles:
-                if (
-                    x - mini_padding < obstacle.x < x + mini_padding
-                    and y < obstacle.y < y + padding
-                ):
-                    return True
+            blocked = (
+                (x - mini_padding < obs_x)
+                & (obs_x < x + mini_padding)
+                & (y < obs_y)
+                & (obs_y < y + padding)
+            )
         elif direction == Direction.EAST:
-            for obstacle in obstacles:
-                if (
-                    y - mini_padding < obstacle.y < y + mini_padding
-                    and x < obstacle.x < x + padding
-                ):
-                    return True
+            blocked = (
+                (y - mini_padding < obs_y)
+                & (obs_y < y + mini_padding)
+                & (x < obs_x)
+                & (obs_x < x + padding)
+            )
         elif direction == Direction.SOUTH:
-            for obstacle in obstacles:
-                if (
-                    x - mini_padding < obstacle.x < x + mini_padding
-                    and y - padding < obstacle.y < y
-                ):
-                    return True
+            blocked = (
+                (x - mini_padding < obs_x)
+                & (obs_x < x + mini_padding)
+                & (y - padding < obs_y)
+                & (obs_y < y)
+            )
         elif direction == Direction.WEST:
-            for obstacle in obstacles:
-                if (
-                    y - mini_padding < obstacle.y < y + mini_padding
-                    and x - padding < obstacle.x < x
-                ):
-                    return True
+            blocked = (
+                (y - mini_padding < obs_y)
+                & (obs_y < y + mini_padding)
+                & (x - padding < obs_x)
+                & (obs_x < x)
+            )
         else:
             raise ValueError(f"Invalid direction {direction}")
-        return False
+        return bool(blocked.any())
 
     def _get_half_turn_angles(
         self, x: int, y: int, new_x: int, new_y: int, direction: Direction
@@ -731,20 +845,17 @@ class MazeSolverSimulation:
         self,
         x: int,
         y: int,
-        obstacles: List[Obstacle],
+        obstacles_xy: np.ndarray,
+        pick: float,
     ) -> Direction:
         """
-        Choose the direction of the robot based on the location of the obstacles.
+        Choose the direction of the robot based on the location of the obstacles, given as an (n, 2) array of their
+        (x, y) positions. pick, a random number in [0, 1), picks the direction among the available ones.
         """
         available_choices = []
-        for direction in [
-            Direction.NORTH,
-            Direction.EAST,
-            Direction.SOUTH,
-            Direction.WEST,
-        ]:
-
-            if self._is_approach_blocked(x, y, direction, obstacles):
+        for direction in SMART_DIRECTIONS:
+
+            if self._is_approach_blocked(x, y, direction, obstacles_xy):
                 continue
 
             if self._unreachable_location(x, y, direction):
@@ -754,7 +865,7 @@ class MazeSolverSimulation:
 
         if not available_choices:
             return None
-        return random.choice(available_choices)
+        return available_choices[int(pick * len(available_choices))]
 
     def _unreachable_location(
         self, x: int, y: int, direction: Direction, padding: int = 6
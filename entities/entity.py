@@ -1,21 +1,33 @@
 from tools.consts import (
     EXPANDED_CELL,
+    HALF_TURN_PADDING,
     SCREENSHOT_COST,
     TOO_CLOSE_COST,
-    TURN_PADDING,
-    MID_TURN_PADDING,
+    TURN_PADDING_SQ,
+    MID_TURN_PADDING_SQ,
 )
+from tools.collision_numba import turn_reachable_kernel
+from tools.jit import NUMBA_AVAILABLE
 from tools.movement import Direction
 
-import math
+import numpy as np
 
-from typing import List
+from functools import lru_cache
+from typing import Iterator, List
 from warnings import warn
 
+# squared paddings for the start, the end and the 3 turn checking points of a turn (see Grid.turn_reachable)
+_TURN_PADDINGS_SQ = np.array(
+    [TURN_PADDING_SQ] * 2 + [MID_TURN_PADDING_SQ] * 3, dtype=np.int32
+)
+
 
 class CellState:
     """Base class for all objects on the arena, such as cells, obstacles, etc"""
 
+    # many cell states are created for each path, slots keep them small and their attributes fast to access
+    __slots__ = ("x", "y", "direction", "screenshot_id", "penalty")
+
     def __init__(
         self,
         x,
@@ -77,10 +89,84 @@ class CellState:
         """
         return {"x": self.x, "y": self.y, "d": self.direction, "s": self.screenshot_id}
 
+    def to_tuple(self):
+        """Returns a tuple representation of the cell, cheaper to build and serialize than get_dict
+
+        Returns:
+            tuple: (x, y, direction value, tuple of screenshot ids)
+        """
+        return self.x, self.y, int(self.direction), tuple(self.screenshot_id)
+
+
+def _build_view_offsets() -> dict:
+    """
+    For each direction of an obstacle, the (dx, dy) offsets from the obstacle of the cells the robot can view the
+    image from, the direction the robot must face there, and the screenshot penalty of each cell
+    """
+    offset = 2 * EXPANDED_CELL
+    costs = (TOO_CLOSE_COST, SCREENSHOT_COST, SCREENSHOT_COST, TOO_CLOSE_COST // 2, 0)
+    positions = {
+        # If the obstacle is facing north, then robot's cell state must be facing south
+        Direction.NORTH: (
+            Direction.SOUTH,
+            [
+                (0, offset),
+                (-1, 2 + offset),
+                (1, 2 + offset),
+                (0, 1 + offset),
+                (0, 2 + offset),
+            ],
+        ),
+        # If obstacle is facing south, then robot's cell state must be facing north
+        Direction.SOUTH: (
+            Direction.NORTH,
+            [
+                (0, -offset),
+                (1, -2 - offset),
+                (-1, -2 - offset),
+                (0, -1 - offset),
+                (0, -2 - offset),
+            ],
+        ),
+        # If obstacle is facing east, then robot's cell state must be facing west
+        Direction.EAST: (
+            Direction.WEST,
+            [
+                (offset, 0),
+                (2 + offset, 1),
+                (2 + offset, -1),
+                (1 + offset, 0),
+                (2 + offset, 0),
+            ],
+        ),
+        # If obstacle is facing west, then robot's cell state must be facing east
+        Direction.WEST: (
+            Direction.EAST,
+            [
+                (-offset, 0),
+                (-2 - offset, 1),
+                (-2 - offset, -1),
+                (-1 - offset, 0),
+                (-2 - offset, 0),
+            ],
+        ),
+    }
+    return {
+        direction: tuple(
+            (dx, dy, robot_direction, cost) for (dx, dy), cost in zip(offsets, costs)
+        )
+        for direction, (robot_direction, offsets) in positions.items()
+    }
+
 
 class Obstacle(CellState):
     """Obstacle class, inherited from CellState"""
 
+    __slots__ = ("obstacle_id",)
+
+    # (dx, dy, robot direction, penalty) of the view states, by the direction of the obstacle
+    _VIEW_OFFSETS = _build_view_offsets()
+
     def __init__(self, x: int, y: int, direction: Direction, obstacle_id: int):
         super().__init__(x, y, direction)
         self.obstacle_id = obstacle_id
@@ -100,111 +186,19 @@ class Obstacle(CellState):
             and self.direction == other.direction
         )
 
-    def get_view_state(self) -> List[CellState]:
+    def get_view_state(self) -> Iterator[CellState]:
         """
-        Constructs the list of CellStates from which the robot can view the image on the obstacle properly.
+        Generates the CellStates from which the robot can view the image on the obstacle properly.
         Currently checks a T shape of grids in front of the image
         "TODO: tune the grid values based on testing
 
         Returns:
-            List[CellState]: Valid cell states where robot can be positioned to view the symbol on the obstacle
+            Iterator[CellState]: Valid cell states where robot can be positioned to view the symbol on the obstacle
         """
-        cells = []
-        offset = 2 * EXPANDED_CELL
-
-        # If the obstacle is facing north, then robot's cell state must be facing south
-        if self.direction == Direction.NORTH:
-            positions = [
-                (self.x, self.y + offset),
-                (self.x - 1, self.y + 2 + offset),
-                (self.x + 1, self.y + 2 + offset),
-                (self.x, self.y + 1 + offset),
-                (self.x, self.y + 2 + offset),
-            ]
-            costs = [
-                TOO_CLOSE_COST,
-                SCREENSHOT_COST,
-                SCREENSHOT_COST,
-                TOO_CLOSE_COST // 2,
-                0,
-            ]
-
-            for idx, pos in enumerate(positions):
-                if Grid.is_valid_grid_position(*pos):
-                    cells.append(
-                        CellState(*pos, Direction.SOUTH, self.obstacle_id, costs[idx])
-                    )
-
-        # If obstacle is facing south, then robot's cell state must be facing north
-        elif self.direction == Direction.SOUTH:
-
-            positions = [
-                (self.x, self.y - offset),
-                (self.x + 1, self.y - 2 - offset),
-                (self.x - 1, self.y - 2 - offset),
-                (self.x, self.y - 1 - offset),
-                (self.x, self.y - 2 - offset),
-            ]
-            costs = [
-                TOO_CLOSE_COST,
-                SCREENSHOT_COST,
-                SCREENSHOT_COST,
-                TOO_CLOSE_COST // 2,
-                0,
-            ]
-
-            for idx, pos in enumerate(positions):
-                if Grid.is_valid_grid_position(*pos):
-                    cells.append(
-                        CellState(*pos, Direction.NORTH, self.obstacle_id, costs[idx])
-                    )
-
-        # If obstacle is facing east, then robot's cell state must be facing west
-        elif self.direction == Direction.EAST:
-            positions = [
-                (self.x + offset, self.y),
-                (self.x + 2 + offset, self.y + 1),
-                (self.x + 2 + offset, self.y - 1),
-                (self.x + 1 + offset, self.y),
-                (self.x + 2 + offset, self.y),
-            ]
-            costs = [
-                TOO_CLOSE_COST,
-                SCREENSHOT_COST,
-                SCREENSHOT_COST,
-                TOO_CLOSE_COST // 2,
-                0,
-            ]
-
-            for idx, pos in enumerate(positions):
-                if Grid.is_valid_grid_position(*pos):
-                    cells.append(
-                        CellState(*pos, Direction.WEST, self.obstacle_id, costs[idx])
-                    )
-
-        # If obstacle is facing west, then robot's cell state must be facing east
-        elif self.direction == Direction.WEST:
-            positions = [
-                (self.x - offset, self.y),
-                (self.x - 2 - offset, self.y + 1),
-                (self.x - 2 - offset, self.y - 1),
-                (self.x - 1 - offset, self.y),
-                (self.x - 2 - offset, self.y),
-            ]
-            costs = [
-                TOO_CLOSE_COST,
-                SCREENSHOT_COST,
-                SCREENSHOT_COST,
-                TOO_CLOSE_COST // 2,
-                0,
-            ]
-
-            for idx, pos in enumerate(positions):
-                if Grid.is_valid_grid_position(*pos):
-                    cells.append(
-                        CellState(*pos, Direction.EAST, self.obstacle_id, costs[idx])
-                    )
-        return cells
+        for dx, dy, robot_direction, cost in self._VIEW_OFFSETS.get(self.direction, ()):
+            x, y = self.x + dx, self.y + dy
+            if Grid.is_valid_grid_position(x, y):
+                yield CellState(x, y, robot_direction, [self.obstacle_id], cost)
 
     def get_obstacle_id(self):
         return self.obstacle_id
@@ -228,27 +222,130 @@ class Grid:
         self.size_y = size_y
         self.obstacles: List[Obstacle] = []
 
+        # incremented whenever the obstacles change, so that callers can tell when their results are outdated
+        self.obstacle_version = 0
+        # obstacle positions as an (n, 2) array, kept in sync with self.obstacles, and its columns as parallel arrays
+        self._set_obstacle_array(np.zeros((0, 2), dtype=np.int32))
+        # (x, y, direction) of the obstacles, to skip duplicates
+        self._obstacle_keys = set()
+        # the first obstacle added with each id, see find_obstacle_by_id
+        self._obstacle_by_id = {}
+
     def add_obstacle(self, obstacle: Obstacle):
         """Add a new obstacle to the Grid object, ignores if duplicate obstacle
 
         Args:
             obstacle (Obstacle): Obstacle to be added
         """
-        # Loop through the existing obstacles to check for duplicates
-        to_add = True
-        for ob in self.obstacles:
-            if ob == obstacle:
-                to_add = False
-                break
+        self.add_obstacles_bulk([obstacle])
 
-        if to_add:
+    def add_obstacles_bulk(self, obstacles: List[Obstacle]):
+        """Add a list of obstacles to the Grid object, ignores duplicate obstacles. The obstacle arrays are rebuilt once
+        for the whole list
+
+        Args:
+            obstacles (List[Obstacle]): Obstacles to be added
+        """
+        added = []
+        for obstacle in obstacles:
+            # obstacles are duplicates if they have the same position and direction (see Obstacle.__eq__)
+            key = (obstacle.x, obstacle.y, obstacle.direction)
+            if key in self._obstacle_keys:
+                continue
+            self._obstacle_keys.add(key)
             self.obstacles.append(obstacle)
+            self._obstacle_by_id.setdefault(obstacle.obstacle_id, obstacle)
+            added.append((obstacle.x, obstacle.y))
+
+        if added:
+            self._set_obstacle_array(
+                np.concatenate((self._obs_xy, np.array(added, dtype=np.int32)))
+            )
 
     def reset_obstacles(self):
         """
         Resets the obstacles in the grid
         """
         self.obstacles = []
+        self._set_obstacle_array(np.zeros((0, 2), dtype=np.int32))
+        self._obstacle_keys = set()
+        self._obstacle_by_id = {}
+
+    def _set_obstacle_array(self, obs_xy: np.ndarray):
+        self._obs_xy = obs_xy
+        self._obs_x = obs_xy[:, 0]
+        self._obs_y = obs_xy[:, 1]
+        self.obstacle_version += 1
+        # the obstacles changed, the reachability caches are rebuilt on the next reachable / half_turn_reachable call
+        self._reachable_mask = None
+        self._half_turn_mask = None
+        self._danger_mask = None
+
+    def build_danger_cache(self, padding: int = 2):
+        """
+        Precompute the squares within padding units in each direction of an obstacle, where the robot might touch it,
+        as a (size_x, size_y) mask
+        """
+        mask = np.zeros((self.size_x, self.size_y), dtype=np.bool_)
+        for ob_x, ob_y in self._obs_xy.tolist():
+            mask[
+                max(0, ob_x - padding) : ob_x + padding + 1,
+                max(0, ob_y - padding) : ob_y + padding + 1,
+            ] = True
+        self._danger_mask = mask
+
+    def danger_mask(self) -> np.ndarray:
+        """
+        (size_x, size_y) mask of the squares near an obstacle (see build_danger_cache), indexed by x, y
+        """
+        if self._danger_mask is None:
+            self.build_danger_cache()
+        return self._danger_mask
+
+    def build_reachability_cache(self):
+        """
+        Precompute reachable (without the bounds check) for every square of the grid, as a (size_x, size_y) mask
+        """
+        xs, ys = np.ogrid[: self.size_x, : self.size_y]
+        mask = np.ones((self.size_x, self.size_y), dtype=np.bool_)
+        for ob_x, ob_y in self._obs_xy.tolist():
+            dx = np.abs(xs - ob_x)
+            dy = np.abs(ys - ob_y)
+            mask &= ~((dx + dy <= 2) | ((dx < 2) & (dy < 2)))
+        self._reachable_mask = mask
+
+    def build_half_turn_cache(self):
+        """
+        Precompute half_turn_reachable (without the bounds checks) for every pair of squares of the grid, as a
+        (size_x, size_y, size_x, size_y) mask indexed by x, y, new_x, new_y
+        """
+        padding = HALF_TURN_PADDING
+        xs = np.arange(self.size_x)
+        ys = np.arange(self.size_y)
+        # lower and upper bounds of the movement on each axis, indexed by (x, new_x) and (y, new_y)
+        low_x, high_x = np.minimum.outer(xs, xs), np.maximum.outer(xs, xs)
+        low_y, high_y = np.minimum.outer(ys, ys), np.maximum.outer(ys, ys)
+        # x is the longer axis of the movement, indexed by (x, y, new_x, new_y)
+        x_longer = (
+            np.abs(np.subtract.outer(xs, xs))[:, None, :, None]
+            > np.abs(np.subtract.outer(ys, ys))[None, :, None, :]
+        )
+
+        blocked = np.zeros(
+            (self.size_x, self.size_y, self.size_x, self.size_y), np.bool_
+        )
+        for ob_x, ob_y in self._obs_xy.tolist():
+            in_x = ((low_x <= ob_x) & (ob_x <= high_x))[:, None, :, None]
+            in_padded_x = ((low_x - padding <= ob_x) & (ob_x <= high_x + padding))[
+                :, None, :, None
+            ]
+            in_y = ((low_y <= ob_y) & (ob_y <= high_y))[None, :, None, :]
+            in_padded_y = ((low_y - padding <= ob_y) & (ob_y <= high_y + padding))[
+                None, :, None, :
+            ]
+            # pad only the shorter axis
+            blocked |= np.where(x_longer, in_x & in_padded_y, in_padded_x & in_y)
+        self._half_turn_mask = ~blocked
 
     def get_obstacles(self):
         """
@@ -271,40 +368,29 @@ class Grid:
         (For more details regarding the 3 points, refer to the _get_turn_checking_points function)
         """
 
-        points = self._get_turn_checking_points(x, y, new_x, new_y, direction)
-
         if not self.is_valid_coord(x, y) or not self.is_valid_coord(new_x, new_y):
             return False
-        for obstacle in self.obstacles:
-            # pre turn
-            preturn_horizontal_distance = obstacle.x - x
-            preturn_vertical_distance = obstacle.y - y
-            preturn_dist = math.sqrt(
-                preturn_horizontal_distance**2 + preturn_vertical_distance**2
+        if NUMBA_AVAILABLE:
+            return turn_reachable_kernel(
+                x,
+                y,
+                new_x,
+                new_y,
+                int(direction),
+                self._obs_xy,
+                self.size_x,
+                self.size_y,
             )
-            if preturn_dist < TURN_PADDING:
-                return False
-
-            # post-turn
-            turn_horizontal_distance = obstacle.x - new_x
-            turn_vertical_distance = obstacle.y - new_y
-            turn_dist = math.sqrt(
-                turn_horizontal_distance**2 + turn_vertical_distance**2
-            )
-            if turn_dist < TURN_PADDING:
-                return False
-
-            # turn
-            for point in points:
-                horizontal_distance = obstacle.x - point[0]
-                vertical_distance = obstacle.y - point[1]
-                if (
-                    math.sqrt(horizontal_distance**2 + vertical_distance**2)
-                    < MID_TURN_PADDING
-                ):
-                    return False
+        if self._obs_x.size == 0:
+            return True
 
-        return True
+        # distances from every obstacle to the start, the end and the 3 turn checking points, in one broadcast
+        points = self._get_turn_checking_points(x, y, new_x, new_y, int(direction))
+        xs = np.array([x, new_x] + [point[0] for point in points])
+        ys = np.array([y, new_y] + [point[1] for point in points])
+        dx = self._obs_x[:, None] - xs[None, :]
+        dy = self._obs_y[:, None] - ys[None, :]
+        return not (dx * dx + dy * dy < _TURN_PADDINGS_SQ).any()
 
     def reachable(self, x: int, y: int) -> bool:
         """Checks whether the given x,y coordinate is reachable/safe for the robot from a straight movement.
@@ -314,15 +400,9 @@ class Grid:
         """
         if not self.is_valid_coord(x, y):
             return False
-
-        for ob in self.obstacles:
-            if abs(ob.x - x) + abs(ob.y - y) <= 2:
-                return False
-
-            if max(abs(ob.x - x), abs(ob.y - y)) < 2:
-                return False
-
-        return True
+        if self._reachable_mask is None:
+            self.build_reachability_cache()
+        return bool(self._reachable_mask[x, y])
 
     def half_turn_reachable(self, x: int, y: int, new_x: int, new_y: int) -> bool:
         """
@@ -333,30 +413,15 @@ class Grid:
         """
         if not self.is_valid_coord(x, y) or not self.is_valid_coord(new_x, new_y):
             return False
-        padding = 2 * EXPANDED_CELL
-        if new_x < x:
-            new_x, x = x, new_x
-        if new_y < y:
-            new_y, y = y, new_y
-        for obs in self.obstacles:
-            if abs(x - new_x) > abs(y - new_y):
-                # x is the longer axis. Use padding only for the y-axis
-                if x <= obs.x <= new_x and y - padding <= obs.y <= new_y + padding:
-                    return False
-            else:
-                # y is the longer axis. Use padding only for the x-axis
-                if x - padding <= obs.x <= new_x + padding and y <= obs.y <= new_y:
-                    return False
-        return True
+        if self._half_turn_mask is None:
+            self.build_half_turn_cache()
+        return bool(self._half_turn_mask[x, y, new_x, new_y])
 
     def is_valid_coord(self, x: int, y: int) -> bool:
         """
         Checks if given position is within bounds
         """
-        if x < 1 or x >= self.size_x - 1 or y < 1 or y >= self.size_y - 1:
-            return False
-
-        return True
+        return 1 <= x < self.size_x - 1 and 1 <= y < self.size_y - 1
 
     def is_valid_cell_state(self, state: CellState) -> bool:
         """
@@ -389,12 +454,10 @@ class Grid:
         """
         Find the obstacle by its id
         """
-        for obstacle in self.obstacles:
-            if obstacle.obstacle_id == obstacle_id:
-                return obstacle
-        return None
+        return self._obstacle_by_id.get(obstacle_id)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def _get_turn_checking_points(
         x: int, y: int, new_x: int, new_y: int, direction: Direction
     ):
@@ -410,6 +473,8 @@ class Grid:
             1. p1x, p1y: A point between the starting point and (mid_x, mid_y)
             2. p2x, p2y: the mid-point between (tr_x, tr_y) and (mid_x, mid_y)
             3. p3x, p3y: A point between the ending point and (mid_x, mid_y)
+
+        The points only depend on the arguments, so they are cached and returned as a tuple.
         """
         mid_x, mid_y = (x + new_x) / 2, (y + new_y) / 2
         if direction == Direction.NORTH or direction == Direction.SOUTH:
@@ -417,13 +482,13 @@ class Grid:
             p1x, p1y = (x + mid_x) / 2, mid_y
             p2x, p2y = (tr_x + mid_x) / 2, (tr_y + mid_y) / 2
             p3x, p3y = mid_x, (new_y + mid_y) / 2
-            return [(p1x, p1y), (p2x, p2y), (p3x, p3y)]
+            return (p1x, p1y), (p2x, p2y), (p3x, p3y)
         elif direction == Direction.EAST or direction == Direction.WEST:
             tr_x, tr_y = new_x, y
             p1x, p1y = mid_x, (y + mid_y) / 2
             p2x, p2y = (tr_x + mid_x) / 2, (tr_y + mid_y) / 2
             p3x, p3y = (new_x + mid_x) / 2, mid_y
-            return [(p1x, p1y), (p2x, p2y), (p3x, p3y)]
+            return (p1x, p1y), (p2x, p2y), (p3x, p3y)
         raise ValueError("Invalid direction")
 
     @classmethod
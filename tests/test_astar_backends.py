@@ -0,0 +1,90 @@
+"""
+Check that the compiled A* search (_astar_numba) and the pure python searches (_astar_search, _dijkstra_multi) find
+paths of the same cost, so that the optimal path does not depend on whether numba is installed.
+
+Without numba, _astar_numba runs as plain python (see tools.jit), so the check runs in either environment.
+Run with pytest, or directly with ``python -m tests.test_astar_backends``.
+"""
+
+import random
+
+import algorithms.algo as algo
+from algorithms.simulation import MazeSolverSimulation
+from tools.movement import Direction
+
+NUM_LAYOUTS = 10
+
+
+def _random_layout(seed: int) -> MazeSolverSimulation:
+    random.seed(seed)
+    sim = MazeSolverSimulation(
+        grid_size_x=20,
+        grid_size_y=20,
+        robot_x=1,
+        robot_y=1,
+        robot_direction=Direction.NORTH,
+    )
+    sim.generate_random_obstacles(random.randint(1, 5))
+    return sim
+
+
+def _python_costs(maze_solver, start, ends) -> list:
+    """
+    Costs from start to each end state found by the pure python searches
+    """
+    numba_available = algo.NUMBA_AVAILABLE
+    algo.NUMBA_AVAILABLE = False
+    try:
+        maze_solver._reset_tables()
+        maze_solver._generate_paths([start] + ends)
+        multi = [
+            maze_solver.cost_table.get(
+                (maze_solver._sidx(start) << 20) | maze_solver._sidx(end)
+            )
+            for end in ends
+        ]
+        single = []
+        for end in ends:
+            maze_solver._reset_tables()
+            maze_solver._astar_search(start, end)
+            single.append(
+                maze_solver.cost_table.get(
+                    (maze_solver._sidx(start) << 20) | maze_solver._sidx(end)
+                )
+            )
+    finally:
+        algo.NUMBA_AVAILABLE = numba_available
+        maze_solver._reset_tables()
+    assert multi == single
+    return single
+
+
+def _compiled_costs(maze_solver, start, ends) -> list:
+    """
+    Costs from start to each end state found by the compiled search, None if the end state cannot be reached
+    """
+    obstacles_xy = maze_solver._obstacles_xy()
+    costs = []
+    for end in ends:
+        cost, _, _ = maze_solver._run_astar_numba(start, end, obstacles_xy)
+        costs.append(int(cost) if cost >= 0 else None)
+    return costs
+
+
+def test_backends_find_equal_costs():
+    for seed in range(NUM_LAYOUTS):
+        maze_solver = _random_layout(seed).maze_solver
+        start = maze_solver.robot.get_start_state()
+        ends = [
+            state
+            for views in maze_solver.grid.get_view_obstacle_positions()
+            for state in views
+        ]
+        assert _python_costs(maze_solver, start, ends) == _compiled_costs(
+            maze_solver, start, ends
+        ), f"costs differ for the layout of seed {seed}"
+
+
+if __name__ == "__main__":
+    test_backends_find_equal_costs()
+    print("ok")
@@ -0,0 +1,53 @@
+"""
+Check that obstacles added through MazeSolver.grid, instead of MazeSolver.add_obstacles, are avoided by the optimal
+path and padded with the safe cost, as the stored paths and the danger mask depend on the obstacles.
+
+Run with pytest, or directly with ``python -m tests.test_grid_obstacles``.
+"""
+
+from algorithms.algo import MazeSolver
+from entities.entity import Obstacle
+from tools.consts import SAFE_COST
+from tools.movement import Direction
+
+
+def _new_solver() -> MazeSolver:
+    return MazeSolver(20, 20, robot_x=1, robot_y=1, robot_direction=Direction.NORTH)
+
+
+def test_grid_obstacles_are_avoided():
+    maze_solver = _new_solver()
+    maze_solver.add_obstacle(10, 10, Direction.WEST, 1)
+    optimal_path, _ = maze_solver.get_optimal_path()
+
+    # block a cell of the path through the grid, the path has to be planned again around it
+    blocked = optimal_path[len(optimal_path) // 2]
+    maze_solver.grid.add_obstacle(Obstacle(blocked.x, blocked.y, Direction.SKIP, 2))
+    optimal_path, cost = maze_solver.get_optimal_path()
+
+    assert optimal_path
+    for state in optimal_path[1:]:
+        assert maze_solver.grid.reachable(state.x, state.y), (state.x, state.y)
+
+    # the same obstacles added through the solver give the same cost
+    expected = _new_solver()
+    expected.add_obstacles(
+        [(10, 10, Direction.WEST, 1), (blocked.x, blocked.y, Direction.SKIP, 2)]
+    )
+    assert cost == expected.get_optimal_path()[1]
+
+
+def test_grid_obstacles_have_safe_cost():
+    maze_solver = _new_solver()
+    maze_solver.grid.add_obstacles_bulk([Obstacle(5, 17, Direction.SOUTH, 1)])
+    assert maze_solver._calculate_safe_cost(5, 16) == SAFE_COST
+    assert maze_solver._calculate_safe_cost(5, 10) == 0
+
+    maze_solver.grid.reset_obstacles()
+    assert maze_solver._calculate_safe_cost(5, 16) == 0
+
+
+if __name__ == "__main__":
+    test_grid_obstacles_are_avoided()
+    test_grid_obstacles_have_safe_cost()
+    print("ok")
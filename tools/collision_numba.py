@@ -0,0 +1,90 @@
+"""
+Compiled collision checks of the robot against the obstacles, shared by Grid and the compiled A* search.
+
+The obstacles are passed as an int32 array of shape (n, 2) of their positions (see Grid._obs_xy). Without numba, these
+are plain python functions (see tools/jit.py) and Grid uses its numpy implementations instead.
+"""
+
+from tools.consts import HALF_TURN_PADDING, TURN_PADDING_SQ, MID_TURN_PADDING_SQ
+from tools.jit import njit
+
+import numpy as np
+
+
+@njit(cache=True)
+def is_valid_coord_kernel(x, y, size_x, size_y):
+    return 1 <= x < size_x - 1 and 1 <= y < size_y - 1
+
+
+@njit(cache=True)
+def reachable_kernel(x, y, obstacles_xy, size_x, size_y):
+    # see Grid.reachable
+    if not is_valid_coord_kernel(x, y, size_x, size_y):
+        return False
+    for i in range(obstacles_xy.shape[0]):
+        dx = abs(obstacles_xy[i, 0] - x)
+        dy = abs(obstacles_xy[i, 1] - y)
+        if dx + dy <= 2 or max(dx, dy) < 2:
+            return False
+    return True
+
+
+@njit(cache=True)
+def half_turn_reachable_kernel(x, y, new_x, new_y, obstacles_xy, size_x, size_y):
+    # see Grid.half_turn_reachable
+    if not is_valid_coord_kernel(x, y, size_x, size_y) or not is_valid_coord_kernel(
+        new_x, new_y, size_x, size_y
+    ):
+        return False
+    padding = HALF_TURN_PADDING
+    if new_x < x:
+        new_x, x = x, new_x
+    if new_y < y:
+        new_y, y = y, new_y
+    x_longer = abs(x - new_x) > abs(y - new_y)
+    for i in range(obstacles_xy.shape[0]):
+        ox, oy = obstacles_xy[i, 0], obstacles_xy[i, 1]
+        if x_longer:
+            if x <= ox <= new_x and y - padding <= oy <= new_y + padding:
+                return False
+        else:
+            if x - padding <= ox <= new_x + padding and y <= oy <= new_y:
+                return False
+    return True
+
+
+@njit(cache=True)
+def turn_reachable_kernel(x, y, new_x, new_y, direction, obstacles_xy, size_x, size_y):
+    # see Grid.turn_reachable and Grid._get_turn_checking_points
+    if not is_valid_coord_kernel(x, y, size_x, size_y) or not is_valid_coord_kernel(
+        new_x, new_y, size_x, size_y
+    ):
+        return False
+
+    mid_x, mid_y = (x + new_x) / 2, (y + new_y) / 2
+    points = np.empty((3, 2))
+    if direction == 0 or direction == 1:
+        # NORTH or SOUTH
+        points[0, 0], points[0, 1] = (x + mid_x) / 2, mid_y
+        points[1, 0], points[1, 1] = (x + mid_x) / 2, (new_y + mid_y) / 2
+        points[2, 0], points[2, 1] = mid_x, (new_y + mid_y) / 2
+    else:
+        # EAST or WEST
+        points[0, 0], points[0, 1] = mid_x, (y + mid_y) / 2
+        points[1, 0], points[1, 1] = (new_x + mid_x) / 2, (y + mid_y) / 2
+        points[2, 0], points[2, 1] = (new_x + mid_x) / 2, mid_y
+
+    for i in range(obstacles_xy.shape[0]):
+        ox, oy = obstacles_xy[i, 0], obstacles_xy[i, 1]
+        # pre-turn and post-turn
+        if (ox - x) * (ox - x) + (oy - y) * (oy - y) < TURN_PADDING_SQ:
+            return False
+        if (ox - new_x) * (ox - new_x) + (oy - new_y) * (oy - new_y) < TURN_PADDING_SQ:
+            return False
+        # turn
+        for k in range(3):
+            hd = ox - points[k, 0]
+            vd = oy - points[k, 1]
+            if hd * hd + vd * vd < MID_TURN_PADDING_SQ:
+                return False
+    return True
@@ -1,5 +1,7 @@
 from tools.movement import Direction
 
+import numpy as np
+
 
 # algo costs: HYPERPARAMETERS
 TURN_FACTOR = 6  # robot moves 8 units per turn
@@ -13,6 +15,9 @@ TOO_CLOSE_COST = (
 # collision consts
 TURN_PADDING = 2
 MID_TURN_PADDING = 2
+# squared paddings, compared against squared distances. int32 like the obstacle arrays
+TURN_PADDING_SQ = np.int32(TURN_PADDING**2)
+MID_TURN_PADDING_SQ = np.int32(MID_TURN_PADDING**2)
 
 # turning consts
 TURN_RADIUS = 1
@@ -32,3 +37,4 @@ ITERATIONS = 2000  # number of iterations
 
 # grid consts
 EXPANDED_CELL = 1  # for both agent and obstacles
+HALF_TURN_PADDING = np.int32(2 * EXPANDED_CELL)  # padding of the shorter axis of a half turn
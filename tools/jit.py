@@ -0,0 +1,24 @@
+"""
+Optional Numba support.
+
+Numba is not a hard requirement of the project. If it is installed, ``njit`` is numba's decorator and the compiled
+kernels are used by the solver. Otherwise ``njit`` is a no-op decorator, ``NUMBA_AVAILABLE`` is False and callers
+fall back to their pure python implementations.
+"""
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        # supports both the bare @njit and the @njit(...) forms
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+
+        return decorator
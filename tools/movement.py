@@ -1,7 +1,10 @@
-from enum import Enum
+import sys
+from enum import IntEnum
 
+import numpy as np
 
-class Direction(int, Enum):
+
+class Direction(IntEnum):
     """
     Enum class representing the directions an entity can face
     """
@@ -12,51 +15,33 @@ class Direction(int, Enum):
     WEST = 3
     SKIP = 4
 
-    def __int__(self):
-        return self.value
-
     @staticmethod
     def rotation_cost(d1, d2):
         """
         Calculate the cost of turning from direction d1 to direction d2
         For a regular left or right turn, the cost is 2. if the robot does not turn, the cost is 0.
-        """
-        if d1 == Direction.NORTH:
-            if d2 in [Direction.EAST, Direction.WEST]:
-                diff = 1
-            elif d2 == Direction.NORTH:
-                return 0
-            else:
-                raise ValueError("Robot cannot turn from north to south")
 
-        elif d1 == Direction.SOUTH:
-            if d2 in [Direction.EAST, Direction.WEST]:
-                diff = 1
-            elif d2 == Direction.SOUTH:
-                return 0
-            else:
-                raise ValueError("Robot cannot turn from south to north")
-
-        elif d1 == Direction.EAST:
-            if d2 in [Direction.NORTH, Direction.SOUTH]:
-                diff = 1
-            elif d2 == Direction.EAST:
-                return 0
-            else:
-                raise ValueError("Robot cannot turn from east to west")
-
-        elif d1 == Direction.WEST:
-            if d2 in [Direction.NORTH, Direction.SOUTH]:
-                diff = 1
-            elif d2 == Direction.WEST:
-                return 0
-            else:
-                raise ValueError("Robot cannot turn from west to east")
+        The turn is assumed to be valid, an impossible turn (e.g. north to south) costs -1. Use rotation_cost_checked
+        to validate the directions.
+        """
+        return _ROT_COST[d1][d2]
 
-        else:
+    @staticmethod
+    def rotation_cost_checked(d1, d2):
+        """
+        Same as rotation_cost, but raises a ValueError if the robot cannot turn from direction d1 to direction d2
+        """
+        try:
+            cost = Direction.rotation_cost(d1, d2)
+        except IndexError:
             raise ValueError(f"direction {d1} is not a valid direction.")
-
-        return diff
+        if cost < 0:
+            if d1 == Direction.SKIP:
+                raise ValueError(f"direction {d1} is not a valid direction.")
+            raise ValueError(
+                f"Robot cannot turn from {Direction(d1).name.lower()} to {Direction(d2).name.lower()}"
+            )
+        return cost
 
     def __repr__(self):
         return self.name
@@ -65,7 +50,18 @@ class Direction(int, Enum):
         return self.name
 
 
-class Motion(int, Enum):
+# rotation cost from direction d1 to direction d2, _ROT_COST[d1][d2], indexed by the direction values. -1 if the robot
+# cannot turn from d1 to d2 (opposite directions and SKIP)
+_ROT_COST = (
+    (0, -1, 1, 1, -1),
+    (-1, 0, 1, 1, -1),
+    (1, 1, 0, -1, -1),
+    (1, 1, -1, 0, -1),
+    (-1, -1, -1, -1, -1),
+)
+
+
+class Motion(IntEnum):
     """
     Enum class for the motion of the robot between two cells
     """
@@ -87,31 +83,18 @@ class Motion(int, Enum):
     # the robot can also capture an image
     CAPTURE = 1000
 
-    def __int__(self):
-        return self.value
-
     def __repr__(self):
         return self.name
 
     def __str__(self):
         return self.name
 
-    def __eq__(self, other: "Motion"):
-        return self.value == other.value
-
     def opposite_motion(self):
         """
         Get the opposite motion of the current motion.
         E.g. if the current motion is FORWARD, the opposite motion is REVERSE.
         """
-        if self == Motion.CAPTURE:
-            return Motion.CAPTURE
-
-        opp_val = 10 - self.value
-        if opp_val == 5 or opp_val < 0 or opp_val > 10:
-            raise ValueError(f"Invalid motion {self}. This should never happen.")
-
-        return Motion(opp_val)
+        return _OPPOSITE_MOTION[self]
 
     def is_combinable(self):
         """
@@ -119,7 +102,7 @@ class Motion(int, Enum):
 
         Note: Updates so that only forward/reverse motions are combinable (due to offsets added to turns while tuning).
         """
-        return self.value in [2, 8]
+        return self in _COMBINABLE_MOTIONS
 
     def reverse_cost(self):
         """
@@ -127,19 +110,10 @@ class Motion(int, Enum):
         Returns:
             int:
         """
-        if self == Motion.CAPTURE:
+        if self is Motion.CAPTURE:
             raise ValueError("Capture motion does not have a reverse cost")
 
-        if self in [
-            Motion.REVERSE_OFFSET_RIGHT,
-            Motion.REVERSE_OFFSET_LEFT,
-            Motion.REVERSE_LEFT_TURN,
-            Motion.REVERSE_RIGHT_TURN,
-            Motion.REVERSE,
-        ]:
-            return 1
-        else:
-            return 0
+        return 1 if self in _REVERSE_MOTIONS else 0
 
     def half_turn_cost(self):
         """
@@ -147,15 +121,40 @@ class Motion(int, Enum):
         Returns:
             int:
         """
-        if self in [
-            Motion.FORWARD_OFFSET_LEFT,
-            Motion.FORWARD_OFFSET_RIGHT,
-            Motion.REVERSE_OFFSET_LEFT,
-            Motion.REVERSE_OFFSET_RIGHT,
-        ]:
-            return 1
-        else:
-            return 0
+        return 1 if self in _HALF_TURN_MOTIONS else 0
+
+
+# opposite of each motion (10 - motion, capture is its own opposite) and the motions with each property
+_OPPOSITE_MOTION = {
+    motion: Motion(10 - motion) if motion is not Motion.CAPTURE else motion
+    for motion in Motion
+}
+_COMBINABLE_MOTIONS = frozenset((Motion.FORWARD, Motion.REVERSE))
+_COMBINABLE_VALUES = np.array(sorted(_COMBINABLE_MOTIONS), dtype=np.int16)
+_REVERSE_MOTIONS = frozenset(
+    (
+        Motion.REVERSE_OFFSET_RIGHT,
+        Motion.REVERSE_OFFSET_LEFT,
+        Motion.REVERSE_LEFT_TURN,
+        Motion.REVERSE_RIGHT_TURN,
+        Motion.REVERSE,
+    )
+)
+_HALF_TURN_MOTIONS = frozenset(
+    (
+        Motion.FORWARD_OFFSET_LEFT,
+        Motion.FORWARD_OFFSET_RIGHT,
+        Motion.REVERSE_OFFSET_LEFT,
+        Motion.REVERSE_OFFSET_RIGHT,
+    )
+)
+
+# marker commands emitted around the motion commands
+_CAPTURE_COMMAND = sys.intern("M0|0|0")
+_FIN_COMMAND = sys.intern("FIN")
+# kind of the command tuples that are emitted as they are, see CommandGenerator._post_process_commands
+_RAW = "RAW"
+_CAPTURE_MARKER = (_RAW, _CAPTURE_COMMAND)
 
 
 class CommandGenerator:
@@ -166,7 +165,7 @@ class CommandGenerator:
     SEP = "|"
     END = ""
     RCV = "r"
-    FIN = "FIN"
+    FIN = _FIN_COMMAND
     INFO_MARKER = "M"
     INFO_DIST = "D"
 
@@ -213,170 +212,204 @@ class CommandGenerator:
         """
         self.straight_speed = straight_speed
         self.turn_speed = turn_speed
+        self._command_templates = self._build_command_templates()
 
-    def _generate_command(self, motion: Motion, num_motions: int = 1):
-        if num_motions > 1:
-            dist = num_motions * self.UNIT_DIST
-            # angle = num_motions * 90  # useful when combining turns which has been disabled due to tuning
-        else:
-            dist = self.UNIT_DIST
-            # angle = 90  # useful when combining turns which has been disabled due to tuning
+    def _build_command_templates(self) -> dict:
+        """
+        Build the commands of each motion from the speeds and tuning values. They do not change between calls, so
+        they are built once. Commands are (flag, speed, angle, distance) tuples, see _format_command. Forward and
+        reverse map to their (flag, speed) since the distance depends on the number of motions, every other motion maps
+        to its list of commands.
+        """
+        templates = {
+            Motion.FORWARD: (self.FORWARD_DIST_TARGET, self.straight_speed),
+            Motion.REVERSE: (self.BACKWARD_DIST_TARGET, self.straight_speed),
+        }
 
         # for each turn you can tune it further by adding an offset in the respective direction (by adding a straight command)
-        if motion == Motion.FORWARD:
-            return [
-                f"{self.FORWARD_DIST_TARGET}{self.straight_speed}{self.SEP}0{self.SEP}{dist}{self.END}"
-            ]
-        elif motion == Motion.REVERSE:
-            return [
-                f"{self.BACKWARD_DIST_TARGET}{self.straight_speed}{self.SEP}0{self.SEP}{dist}{self.END}"
-            ]
-        elif motion == Motion.FORWARD_LEFT_TURN:
-            cmd1 = f"{self.FORWARD_DIST_TARGET}{self.turn_speed}{self.SEP}-{self.FORWARD_TURN_ANGLE_LEFT}{self.SEP}{self.FORWARD_LEFT_FINAL_ANGLE}{self.END}"
+        templates[Motion.FORWARD_LEFT_TURN] = [
+            (
+                self.FORWARD_DIST_TARGET,
+                self.turn_speed,
+                -self.FORWARD_TURN_ANGLE_LEFT,
+                self.FORWARD_LEFT_FINAL_ANGLE,
+            ),
             # move robot front to make the robot end in the middle of the cell
-            cmd2 = f"{self.FORWARD_DIST_TARGET}{self.straight_speed}{self.SEP}0{self.SEP}{6}{self.END}"
-
-        elif motion == Motion.FORWARD_RIGHT_TURN:
-            cmd1 = f"{self.FORWARD_DIST_TARGET}{self.straight_speed}{self.SEP}0{self.SEP}{5}{self.END}"
-            cmd2 = f"{self.FORWARD_DIST_TARGET}{self.turn_speed}{self.SEP}{self.FORWARD_TURN_ANGLE_RIGHT}{self.SEP}{self.FORWARD_RIGHT_FINAL_ANGLE}{self.END}"  # 88
+            (self.FORWARD_DIST_TARGET, self.straight_speed, 0, 6),
+        ]
+        templates[Motion.FORWARD_RIGHT_TURN] = [
+            (self.FORWARD_DIST_TARGET, self.straight_speed, 0, 5),
+            (
+                self.FORWARD_DIST_TARGET,
+                self.turn_speed,
+                self.FORWARD_TURN_ANGLE_RIGHT,
+                self.FORWARD_RIGHT_FINAL_ANGLE,
+            ),  # 88
             # move robot front to make the robot end in the middle of the cell
-            cmd3 = f"{self.FORWARD_DIST_TARGET}{self.straight_speed}{self.SEP}0{self.SEP}{12}{self.END}"
-            return [cmd1, cmd2, cmd3]
-
-        elif motion == Motion.REVERSE_LEFT_TURN:
+            (self.FORWARD_DIST_TARGET, self.straight_speed, 0, 12),
+        ]
+        templates[Motion.REVERSE_LEFT_TURN] = [
             # reverse first before turning to make the robot end in the middle of the cell
-            cmd1 = f"{self.BACKWARD_DIST_TARGET}{self.straight_speed}{self.SEP}0{self.SEP}{6}{self.END}"
-            cmd2 = f"{self.BACKWARD_DIST_TARGET}{self.turn_speed}{self.SEP}-{self.BACKWARD_TURN_ANGLE_LEFT}{self.SEP}{self.BACKWARD_LEFT_FINAL_ANGLE}{self.END}"
-            # cmd3 = f"{self.BACKWARD_DIST_TARGET}{self.straight_speed}{self.SEP}0{self.SEP}{3}{self.END}"
-            return [cmd1, cmd2]
-
-        elif motion == Motion.REVERSE_RIGHT_TURN:
+            (self.BACKWARD_DIST_TARGET, self.straight_speed, 0, 6),
+            (
+                self.BACKWARD_DIST_TARGET,
+                self.turn_speed,
+                -self.BACKWARD_TURN_ANGLE_LEFT,
+                self.BACKWARD_LEFT_FINAL_ANGLE,
+            ),
+            # (self.BACKWARD_DIST_TARGET, self.straight_speed, 0, 3),
+        ]
+        templates[Motion.REVERSE_RIGHT_TURN] = [
             # reverse first before turning to make the robot end in the middle of the cell
-            cmd1 = f"{self.BACKWARD_DIST_TARGET}{self.straight_speed}{self.SEP}0{self.SEP}{7}{self.END}"
-            cmd2 = f"{self.BACKWARD_DIST_TARGET}{self.turn_speed}{self.SEP}{self.BACKWARD_TURN_ANGLE_RIGHT}{self.SEP}{self.BACKWARD_RIGHT_FINAL_ANGLE}{self.END}"
-            cmd3 = f"{self.BACKWARD_DIST_TARGET}{self.straight_speed}{self.SEP}0{self.SEP}{4}{self.END}"
-            return [cmd1, cmd2, cmd3]
-
-        # cannot combine with other motions
-        elif motion == Motion.FORWARD_OFFSET_LEFT:
-            # break it down into 2 steps
-            cmd1 = f"{self.FORWARD_DIST_TARGET}{self.turn_speed}{self.SEP}{-14}{self.SEP}{21}{self.END}"
-            cmd2 = f"{self.FORWARD_DIST_TARGET}{self.turn_speed}{self.SEP}{17}{self.SEP}{21}{self.END}"
-        elif motion == Motion.FORWARD_OFFSET_RIGHT:
-            # break it down into 2 steps
-            cmd1 = f"{self.FORWARD_DIST_TARGET}{self.turn_speed}{self.SEP}{14}{self.SEP}{21}{self.END}"
-            cmd2 = f"{self.FORWARD_DIST_TARGET}{self.straight_speed}{self.SEP}{-17}{self.SEP}{21}{self.END}"
-        elif motion == Motion.REVERSE_OFFSET_LEFT:
-            # break it down into 2 steps
-            cmd1 = f"{self.BACKWARD_DIST_TARGET}{self.turn_speed}{self.SEP}{-15}{self.SEP}{24}{self.END}"
-            cmd2 = f"{self.BACKWARD_DIST_TARGET}{self.turn_speed}{self.SEP}{25}{self.SEP}{25}{self.END}"
-        elif motion == Motion.REVERSE_OFFSET_RIGHT:
-            # break it down into 2 steps
-            cmd1 = f"{self.BACKWARD_DIST_TARGET}{self.turn_speed}{self.SEP}{15}{self.SEP}{24}{self.END}"
-            cmd2 = f"{self.BACKWARD_DIST_TARGET}{self.turn_speed}{self.SEP}{-25}{self.SEP}{25}{self.END}"
-        else:
+            (self.BACKWARD_DIST_TARGET, self.straight_speed, 0, 7),
+            (
+                self.BACKWARD_DIST_TARGET,
+                self.turn_speed,
+                self.BACKWARD_TURN_ANGLE_RIGHT,
+                self.BACKWARD_RIGHT_FINAL_ANGLE,
+            ),
+            (self.BACKWARD_DIST_TARGET, self.straight_speed, 0, 4),
+        ]
+
+        # cannot combine with other motions, each is broken down into 2 steps
+        templates[Motion.FORWARD_OFFSET_LEFT] = [
+            (self.FORWARD_DIST_TARGET, self.turn_speed, -14, 21),
+            (self.FORWARD_DIST_TARGET, self.turn_speed, 17, 21),
+        ]
+        templates[Motion.FORWARD_OFFSET_RIGHT] = [
+            (self.FORWARD_DIST_TARGET, self.turn_speed, 14, 21),
+            (self.FORWARD_DIST_TARGET, self.straight_speed, -17, 21),
+        ]
+        templates[Motion.REVERSE_OFFSET_LEFT] = [
+            (self.BACKWARD_DIST_TARGET, self.turn_speed, -15, 24),
+            (self.BACKWARD_DIST_TARGET, self.turn_speed, 25, 25),
+        ]
+        templates[Motion.REVERSE_OFFSET_RIGHT] = [
+            (self.BACKWARD_DIST_TARGET, self.turn_speed, 15, 24),
+            (self.BACKWARD_DIST_TARGET, self.turn_speed, -25, 25),
+        ]
+        return templates
+
+    def _generate_command(self, motion: Motion, num_motions: int = 1) -> list:
+        """
+        Generate the commands of a run of num_motions motions as (flag, speed, angle, distance) tuples
+        """
+        try:
+            template = self._command_templates[motion]
+        except KeyError:
             raise ValueError(f"Invalid motion {motion}. This should never happen.")
-        return [cmd1, cmd2]
+
+        if isinstance(template, tuple):
+            # forward or reverse
+            # angle = num_motions * 90  # useful when combining turns which has been disabled due to tuning
+            dist = num_motions * self.UNIT_DIST if num_motions > 1 else self.UNIT_DIST
+            flag, speed = template
+            return [(flag, speed, 0, dist)]
+        return list(template)
 
     def generate_commands(self, motions, obstacle_ids, testing=False):
         """
         Generate commands based on the list of motions
+
+        The commands are built and merged as tuples (see _post_process_commands) and only formatted into strings at
+        the end.
         """
         snap_count = 0
         if not motions:
             return []
-        commands = []
-        prev_motion = motions[0]
-        # cur_cmd = self._generate_command(prev_motion)
-        num_motions = 1
-        for motion in motions[1:]:
-            # if combinable motions
-            if motion == prev_motion and motion.is_combinable():
-                # increment the number of combined motions
-                num_motions += 1
-            # convert prev motion to command
-            else:
-                if prev_motion == Motion.CAPTURE:
-                    commands.append(f"M0|0|0")
-                    commands.append(f"SNAP{obstacle_ids[snap_count]}")
-                    snap_count += 1
-                    prev_motion = motion
-                    continue
-                if testing:
-                    raise ValueError("This function is DEPRECATED!!")
-                else:
-                    cur_cmd = self._generate_command(prev_motion, num_motions)
-                commands.extend(cur_cmd)
-                num_motions = 1
-
-            prev_motion = motion
-
-        # add the last command
         if testing:
             raise ValueError("This function is DEPRECATED!!")
-        else:
-            if prev_motion == Motion.CAPTURE:
-                commands.append(f"M0|0|0")
-                commands.append(f"SNAP{obstacle_ids[snap_count]}")
+
+        # split the motions into runs, a run is a single motion or consecutive equal combinable motions
+        values = np.fromiter(map(int, motions), dtype=np.int16, count=len(motions))
+        combinable = np.isin(values, _COMBINABLE_VALUES)
+        run_starts = np.flatnonzero(
+            np.concatenate(([True], (values[1:] != values[:-1]) | ~combinable[1:]))
+        )
+        run_lengths = np.diff(np.append(run_starts, len(values)))
+
+        # convert each run to commands
+        capture = Motion.CAPTURE
+        generate_command = self._generate_command
+        commands = []
+        append = commands.append
+        extend = commands.extend
+        for start, num_motions in zip(run_starts.tolist(), run_lengths.tolist()):
+            motion = motions[start]
+            if motion is capture:
+                append(_CAPTURE_MARKER)
+                append((_RAW, f"SNAP{obstacle_ids[snap_count]}"))
+                snap_count += 1
             else:
-                cur_cmd = self._generate_command(prev_motion, num_motions)
-                commands.extend(cur_cmd)
+                extend(generate_command(motion, num_motions))
 
         # add the final command
-        commands.append(f"{self.FIN}")
+        append((_RAW, self.FIN))
         commands = CommandGenerator._post_process_commands(commands)
-        return commands
+        return [CommandGenerator._format_command(cmd) for cmd in commands]
 
     @staticmethod
     def _post_process_commands(commands: list):
         """
         Merge commands that can be combined. Currently only merges forward and backward commands
+
+        Works on the command tuples of generate_commands, markers (snap, M0|0|0 and FIN) are (_RAW, command) tuples
+        and are never merged.
         """
         merged_commands = []
+        append = merged_commands.append
+        # command waiting to be merged with the next one
         prev_cmd = None
 
         for cmd in commands:
-            if prev_cmd:
-                # check if command is snap, D0|0|0 or FIN
-                if cmd == "FIN" or cmd.startswith("SNAP") or cmd == "M0|0|0":
-                    merged_commands.append(prev_cmd)
+            # check if command is snap, M0|0|0 or FIN
+            if cmd[0] is _RAW:
+                if prev_cmd:
+                    append(prev_cmd)
                     prev_cmd = None
-                    merged_commands.append(cmd)
-                    continue
+                append(cmd)
+                continue
 
+            if prev_cmd:
                 # check if commands can be merged
-                merged_cmd = CommandGenerator._merge_commands(prev_cmd, cmd)
+                merged_cmd = CommandGenerator._merge_parsed_commands(prev_cmd, cmd)
                 if merged_cmd:
                     prev_cmd = merged_cmd
                 else:
-                    merged_commands.append(prev_cmd)
+                    append(prev_cmd)
                     prev_cmd = cmd
             else:
-                if cmd == "FIN" or cmd.startswith("SNAP") or cmd == "M0|0|0":
-                    merged_commands.append(cmd)
-                    continue
                 prev_cmd = cmd
         # last command always FIN, so no need to check
         return merged_commands
 
     @staticmethod
-    def _merge_commands(cmd1: str, cmd2: str):
+    def _parse_command(cmd: str) -> tuple:
         """
-        Merge two commands that can be combined
-        NOTE: This function can only merge forward and backward commands
+        Parse a movement command string into its (flag, speed, angle, distance) tuple
         """
-        result1, result2 = cmd1.split("|"), cmd2.split("|")
+        head, angle, dist = cmd.split("|")
+        return head[0], head[1:], int(angle), int(dist)
+
+    @staticmethod
+    def _format_command(cmd: tuple) -> str:
+        if cmd[0] is _RAW:
+            return cmd[1]
+        return "%s%s|%s|%s" % cmd
+
+    @staticmethod
+    def _merge_parsed_commands(cmd1: tuple, cmd2: tuple):
+        """
+        Merge two command tuples that can be combined, see _merge_commands
+        """
+        motion1, speed, angle1, dist1 = cmd1
+        motion2, _, angle2, dist2 = cmd2
 
         # angles have to be 0
-        angle1, angle2 = int(result1[1]), int(result2[1])
         if angle1 != angle2 or angle1 != 0:
             return None
 
-        dist1, dist2 = int(result1[2]), int(result2[2])
-
         # speed of commands is always the same
-        motion1, motion2 = result1[0][0], result2[0][0]
-
         if motion1 != motion2:
             if dist1 > dist2:
                 # choose motion1
@@ -389,5 +422,17 @@ class CommandGenerator:
             used_motion = motion1
             used_dist = dist1 + dist2
 
-        speed = result1[0][1:]
-        return f"{used_motion}{speed}|{0}|{used_dist}"
+        return used_motion, speed, 0, used_dist
+
+    @staticmethod
+    def _merge_commands(cmd1: str, cmd2: str):
+        """
+        Merge two commands that can be combined
+        NOTE: This function can only merge forward and backward commands
+        """
+        merged = CommandGenerator._merge_parsed_commands(
+            CommandGenerator._parse_command(cmd1), CommandGenerator._parse_command(cmd2)
+        )
+        if merged is None:
+            return None
+        return CommandGenerator._format_command(merged)